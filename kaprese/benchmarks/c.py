@@ -1,74 +1,49 @@
-from kaprese.core.benchmark import Benchmark
+from kaprese.core.benchmark import BenchmarkFamily, register_families
 from kaprese.utils.logging import logger
 
+_INSTALL_JQ = "export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1"
+
+FAMILIES = [
+    BenchmarkFamily(
+        "flex",
+        "flex-{index}",
+        "ghcr.io/kupl/starlab-benchmarks/c:flex-{index}",
+        1,
+        7,
+        language_command="cat metadata.json | jq -r .language",
+        workdir_command="cd $(cat metadata.json | jq -r .buggyPath) && pwd",
+        metadata_file="metadata.json",
+    ),
+    BenchmarkFamily(
+        "flint",
+        "flint-{index}",
+        "ghcr.io/kupl/starlab-benchmarks/c:flint-{index}",
+        1,
+        2,
+        language_command="cat metadata.json | jq -r .language",
+        workdir_command="cd $(cat metadata.json | jq -r .buggyPath) && pwd",
+        metadata_file="metadata.json",
+    ),
+    BenchmarkFamily(
+        "spearmint",
+        "spearmint-{index}",
+        "ghcr.io/kupl/starlab-benchmarks/c:spearmint-{index}",
+        1,
+        2,
+        language_command=f"{_INSTALL_JQ} && cat metadata.json | jq -r .language",
+        workdir_command=f"{_INSTALL_JQ} && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
+        metadata_file="metadata.json",
+    ),
+]
 
-def register_benchmarks(overwrite: bool = False) -> None:
-    flexs = [
-        Benchmark(
-            f"flex-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/c:flex-{i}",
-            language_command="cat metadata.json | jq -r .language",
-            workdir_command="cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 7)
-    ]
-
-    flints = [
-        Benchmark(
-            f"flint-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/c:flint-{i}",
-            language_command="cat metadata.json | jq -r .language",
-            workdir_command="cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 2)
-    ]
 
-    spearmints = [
-        Benchmark(
-            f"spearmint-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/c:spearmint-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 2)
-    ]
-
-    for bench in [*flexs, *flints, *spearmints]:
-        logger.info(f"Registering c benchmark {bench.name}")
-        bench.register(overwrite=overwrite)
+def register_benchmarks(overwrite: bool = False) -> None:
+    for family in FAMILIES:
+        logger.info(f"Registering c benchmark family {family.name}")
+    register_families(FAMILIES, overwrite=overwrite)
 
 
 def unregister_benchmarks(delete_image: bool = False) -> None:
-    flexs = [
-        Benchmark(
-            f"flex-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/c:flex-{i}",
-            language_command="cat metadata.json | jq -r .language",
-            workdir_command="cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 7)
-    ]
-
-    flints = [
-        Benchmark(
-            f"flint-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/c:flint-{i}",
-            language_command="cat metadata.json | jq -r .language",
-            workdir_command="cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 2)
-    ]
-
-    spearmints = [
-        Benchmark(
-            f"spearmint-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/c:spearmint-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 2)
-    ]
-
-    for bench in [*flexs, *flints, *spearmints]:
-        logger.info(f"Unregistering c benchmark {bench.name}")
-        bench.unregister(delete_image=delete_image)
+    for family in FAMILIES:
+        logger.info(f"Unregistering c benchmark family {family.name}")
+        family.unregister(delete_image=delete_image)
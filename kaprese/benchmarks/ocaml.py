@@ -1,74 +1,30 @@
-from kaprese.core.benchmark import Benchmark
+from kaprese.core.benchmark import BenchmarkFamily, register_families
 from kaprese.utils.logging import logger
 
+_INSTALL_JQ = "export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1"
 
-def register_benchmarks(overwrite: bool = False) -> None:
-    formulas = [
-        Benchmark(
-            f"formula-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/ocaml:formula-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 101)
-    ]
-
-    diffs = [
-        Benchmark(
-            f"diff-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/ocaml:diff-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 101)
-    ]
+FAMILIES = [
+    BenchmarkFamily(
+        problem,
+        f"{problem}-{{index}}",
+        f"ghcr.io/kupl/starlab-benchmarks/ocaml:{problem}-{{index}}",
+        1,
+        101,
+        language_command=f"{_INSTALL_JQ} && cat metadata.json | jq -r .language",
+        workdir_command=f"{_INSTALL_JQ} && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
+        metadata_file="metadata.json",
+    )
+    for problem in ["formula", "diff", "lambda"]
+]
 
-    lambdas = [
-        Benchmark(
-            f"lambda-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/ocaml:lambda-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 101)
-    ]
 
-    for bench in [*formulas, *diffs, *lambdas]:
-        logger.info(f"Registering ocaml benchmark {bench.name}")
-        bench.register(overwrite=overwrite)
+def register_benchmarks(overwrite: bool = False) -> None:
+    for family in FAMILIES:
+        logger.info(f"Registering ocaml benchmark family {family.name}")
+    register_families(FAMILIES, overwrite=overwrite)
 
 
 def unregister_benchmarks(delete_image: bool = False) -> None:
-    formulas = [
-        Benchmark(
-            f"formula-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/ocaml:formula-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 101)
-    ]
-
-    diffs = [
-        Benchmark(
-            f"diff-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/ocaml:diff-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 101)
-    ]
-
-    lambdas = [
-        Benchmark(
-            f"lambda-{i}",
-            f"ghcr.io/kupl/starlab-benchmarks/ocaml:lambda-{i}",
-            language_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cat metadata.json | jq -r .language",
-            workdir_command="export DEBIAN_FRONTEND=non-interactive && apt-get update >/dev/null 2>&1 && apt-get install -y --no-install-recommends jq >/dev/null 2>&1 && cd $(cat metadata.json | jq -r .buggyPath) && pwd",
-        )
-        for i in range(1, 101)
-    ]
-
-    for bench in [*formulas, *diffs, *lambdas]:
-        logger.info(f"Unregistering ocaml benchmark {bench.name}")
-        bench.unregister(delete_image=delete_image)
+    for family in FAMILIES:
+        logger.info(f"Unregistering ocaml benchmark family {family.name}")
+        family.unregister(delete_image=delete_image)
@@ -54,6 +54,11 @@ def main(argv: Optional[List[str]] = None) -> None:
         add_help=False,
         help="eval engines",
     )
+    store_parser = subparsers.add_parser(
+        "store",
+        add_help=False,
+        help="deduplicated output store",
+    )
 
     args, remainder = parser.parse_known_args(argv)
 
@@ -95,6 +100,11 @@ def main(argv: Optional[List[str]] = None) -> None:
 
         main(eval_parser, remainder, args)
 
+    elif args.subcommand == "store":
+        from kaprese.bin.kaprese_store import main
+
+        main(store_parser, remainder, args)
+
     else:
         parser.print_help()
         sys.exit(1)
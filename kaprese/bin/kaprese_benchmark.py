@@ -1,15 +1,52 @@
+from __future__ import annotations
+
 import argparse
 import sys
-from typing import Callable
-
-from rich.table import Table
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from typing import TYPE_CHECKING, Any, Callable
 
 from kaprese.benchmarks.c import register_benchmarks as register_c_benchmarks
 from kaprese.benchmarks.ocaml import register_benchmarks as register_ocaml_benchmarks
-from kaprese.core.benchmark import Benchmark, all_benchmarks
-from kaprese.utils.console import console
+from kaprese.core.benchmark import Benchmark, all_benchmarks, check_availability
 from kaprese.utils.logging import logger
 
+if TYPE_CHECKING:
+    from rich.progress import Progress, TaskID
+
+
+class _PullProgress:
+    """Aggregate per-layer pull events of an image into a progress task"""
+
+    def __init__(self, progress: Progress, task: TaskID) -> None:
+        self._progress = progress
+        self._task = task
+        self._layers: dict[str, tuple[int, int]] = {}
+
+    def __call__(self, event: dict[str, Any]) -> None:
+        from rich.filesize import decimal
+
+        layer = event.get("id")
+        if layer is None:
+            return
+        status = event.get("status", "")
+        detail = event.get("progressDetail") or {}
+        if status == "Downloading" and "total" in detail:
+            self._layers[layer] = (detail.get("current", 0), detail["total"])
+        elif status in ("Download complete", "Pull complete", "Already exists"):
+            if (known := self._layers.get(layer)) is not None:
+                self._layers[layer] = (known[1], known[1])
+        else:
+            return
+        completed = sum(current for current, _ in self._layers.values())
+        total = sum(total for _, total in self._layers.values())
+        self._progress.update(
+            self._task,
+            completed=completed,
+            total=total or None,
+            size=f"{decimal(completed)} / {decimal(total)}",
+        )
+
 
 def main(
     parser: argparse.ArgumentParser,
@@ -55,6 +92,14 @@ def main(
     prepare_parser.add_argument(
         "-f", "--force", action="store_true", help="force prepare benchmarks"
     )
+    prepare_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        metavar="N",
+        help="number of benchmarks to prepare concurrently (default=%(default)s)",
+    )
     prepare_parser.add_argument(
         "benchmark",
         nargs="*",
@@ -77,12 +122,19 @@ def main(
     # Branching to pass type checking
     args = parser.parse_args(argv, namespace=args) if args else parser.parse_args(argv)
 
-    if args.subcommand == "list":
-        if args.quiet:
-            for benchmark in all_benchmarks():
-                print(benchmark.name)
+    if args.subcommand == "list" and args.quiet:
+        # Listing names is scripted, do not import Rich
+        for benchmark in all_benchmarks():
+            print(benchmark.name)
+        return
+
+    from rich.progress import BarColumn, Progress, TextColumn
+    from rich.table import Table
+
+    from kaprese.utils.console import console
 
-        elif not args.detail:
+    if args.subcommand == "list":
+        if not args.detail:
             table = Table(title="kaprese benchmarks")
             table.add_column("name", justify="left")
             table.add_column("image", justify="left")
@@ -100,14 +152,26 @@ def main(
             table.add_column("workdir", justify="left")
 
             with console.status("") as status:
-                for i, benchmark in enumerate(all := all_benchmarks()):
+                status.update("[bold green]Checking availability of benchmarks")
+                availability = check_availability(all := all_benchmarks())
+                for i, benchmark in enumerate(all):
                     status.update(
                         f"[bold green][{i + 1} / {len(all)}] Checking benchmark {benchmark.name}"
                     )
+                    if not availability[benchmark.name]:
+                        table.add_row(
+                            benchmark.name,
+                            benchmark.image,
+                            "[grey23]no[/grey23]",
+                            "[grey23]n/a[/grey23]",
+                            "[grey23]n/a[/grey23]",
+                            "[grey23]n/a[/grey23]",
+                        )
+                        continue
                     table.add_row(
                         benchmark.name,
                         benchmark.image,
-                        "yes" if benchmark.availability else "[grey23]no[/grey23]",
+                        "yes",
                         (
                             language
                             if (language := benchmark.language)
@@ -154,42 +218,78 @@ def main(
             prepare_parser.print_help()
             sys.exit(1)
 
+        benchmarks: list[Benchmark] = []
         if "all" in args.benchmark:
-            args.benchmark = [b.name for b in all_benchmarks()]
-
-        with console.status("") as status:
-            for i, bench_name in enumerate(args.benchmark):
-                status.update(
-                    f"[bold green][{i + 1} / {len(args.benchmark)}][/bold green] Preparing benchmark {bench_name}"
-                )
-
+            benchmarks = all_benchmarks()
+        else:
+            for bench_name in args.benchmark:
                 benchmark = Benchmark.load(bench_name)
                 if benchmark is None:
                     logger.warning(f'Benchmark "{bench_name}" not found')
                     console.print(f'Benchmark "{bench_name}" not found')
                     continue
+                benchmarks.append(benchmark)
+
+        with console.status("[bold green]Checking availability of benchmarks"):
+            check_availability(benchmarks)
+
+        with Progress(
+            TextColumn("{task.description}"),
+            BarColumn(),
+            TextColumn("{task.fields[size]}"),
+            console=console,
+        ) as progress:
+            overall = progress.add_task(
+                "[bold green]Preparing benchmarks",
+                total=len(benchmarks),
+                size=f"0 / {len(benchmarks)}",
+            )
+            n_done = count(1)
+
+            def prepare(benchmark: Benchmark) -> None:
+                bench_name = benchmark.name
+                task = progress.add_task(f"Pulling {bench_name}", total=None, size="")
+                pull_progress = _PullProgress(progress, task)
+                try:
+                    if args.force:
+                        benchmark.cleanup()
+                    benchmark.pull(force=args.force, progress=pull_progress)
+
+                    if not benchmark.availability:
+                        logger.warning(f'Failed to pull benchmark "{bench_name}"')
+                        console.print(f'Failed to prepare benchmark "{bench_name}"')
+                        return
+
+                    progress.update(task, description=f"Probing {bench_name}")
+                    if benchmark.language is None:
+                        logger.warning(
+                            f'Failed to get language of benchmark "{bench_name}"'
+                        )
+
+                    if benchmark.os is None:
+                        logger.warning(f'Failed to get os of benchmark "{bench_name}"')
+
+                    if benchmark.workdir is None:
+                        logger.warning(
+                            f'Failed to get workdir of benchmark "{bench_name}"'
+                        )
 
-                if args.force:
-                    benchmark.cleanup()
-                benchmark.pull(force=args.force)
-
-                if not benchmark.availability:
-                    logger.warning(f'Failed to pull benchmark "{bench_name}"')
-                    console.print(f'Failed to prepare benchmark "{bench_name}"')
-                    continue
-
-                if benchmark.language is None:
-                    logger.warning(
-                        f'Failed to get language of benchmark "{bench_name}"'
+                    benchmark.save()
+                finally:
+                    progress.remove_task(task)
+                    done = next(n_done)
+                    progress.update(
+                        overall, completed=done, size=f"{done} / {len(benchmarks)}"
                     )
 
-                if benchmark.os is None:
-                    logger.warning(f'Failed to get os of benchmark "{bench_name}"')
-
-                if benchmark.workdir is None:
-                    logger.warning(f'Failed to get workdir of benchmark "{bench_name}"')
-
-                benchmark.save()
+            with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+                futures = [executor.submit(prepare, b) for b in benchmarks]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
 
         console.print(":thumbs_up: Done!")
         console.print(
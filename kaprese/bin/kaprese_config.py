@@ -1,10 +1,7 @@
 import argparse
 import sys
 
-from rich.table import Table
-
 from kaprese.core.config import CONFIGURE, KEYS, SETTABLE_KEYS
-from kaprese.utils.console import console
 from kaprese.utils.logging import logger
 
 
@@ -32,13 +29,17 @@ def main(
 
     if args.subcommand == "set":
         for setup in args.setup:
-            key, value = setup.split("=")
+            key, value = setup.split("=", 1)
             if key not in SETTABLE_KEYS:
                 logger.warning(f"Invalid key: {key} ({value}, ignored)")
                 continue
             setattr(CONFIGURE, key, value)
 
     elif args.subcommand == "show":
+        from rich.table import Table
+
+        from kaprese.utils.console import console
+
         table = Table(title="kaprese configuration")
         table.add_column("key", justify="left")
         table.add_column("value", justify="left")
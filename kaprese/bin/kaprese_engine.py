@@ -2,11 +2,8 @@ import argparse
 import json
 import sys
 
-from rich.table import Table
-
 from kaprese.core.engine import Engine, all_engines
 from kaprese.engines import ENGINES
-from kaprese.utils.console import console
 
 
 def main(
@@ -42,22 +39,28 @@ def main(
     # Branching to pass type checking
     args = parser.parse_args(argv, namespace=args) if args else parser.parse_args(argv)
 
+    if args.subcommand == "list" and args.quiet:
+        # Listing names is scripted, do not import Rich
+        for engine in all_engines():
+            print(engine.name)
+        return
+
+    from rich.table import Table
+
+    from kaprese.utils.console import console
+
     if args.subcommand == "list":
-        if args.quiet:
-            for engine in all_engines():
-                print(engine.name)
-        else:
-            table = Table(title="kaprese engines")
-            table.add_column("name", justify="left")
-            table.add_column("supported languages", justify="left")
-            table.add_column("supported os", justify="left")
-            for engine in all_engines():
-                table.add_row(
-                    engine.name,
-                    ", ".join(engine.supported_languages),
-                    ", ".join(engine.supported_os),
-                )
-            console.print(table)
+        table = Table(title="kaprese engines")
+        table.add_column("name", justify="left")
+        table.add_column("supported languages", justify="left")
+        table.add_column("supported os", justify="left")
+        for engine in all_engines():
+            table.add_row(
+                engine.name,
+                ", ".join(engine.supported_languages),
+                ", ".join(engine.supported_os),
+            )
+        console.print(table)
 
     elif args.subcommand == "inspect":
         engine = Engine.load(args.engine)
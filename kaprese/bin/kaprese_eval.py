@@ -3,10 +3,50 @@ import sys
 
 from rich.table import Table
 
+from kaprese.core.eval import Eval
 from kaprese.eval import ENGINES
 from kaprese.utils.console import console
 
 
+def _seconds(seconds: float | None) -> str:
+    return f"{seconds:.1f}s" if seconds is not None else "n/a"
+
+
+def _family_table(eval: str, eval_result: Eval) -> Table:
+    table = Table(title=f"Eval {eval} per family")
+    table.add_column("Family", justify="left")
+    table.add_column("Total", justify="right")
+    table.add_column("Correct", justify="right")
+    table.add_column("Accuracy", justify="right")
+    table.add_column("95% CI", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p90", justify="right")
+    table.add_column("p99", justify="right")
+    for stats in eval_result.family_stats():
+        table.add_row(
+            stats.family,
+            str(stats.total),
+            str(stats.correct),
+            f"{stats.accuracy:.2%}",
+            f"{stats.accuracy_low:.2%} - {stats.accuracy_high:.2%}",
+            _seconds(stats.p50),
+            _seconds(stats.p90),
+            _seconds(stats.p99),
+        )
+    return table
+
+
+def _counts_table(eval: str, benchmark_counts: dict[str, dict[str, int]]) -> Table:
+    columns = list(dict.fromkeys(k for c in benchmark_counts.values() for k in c))
+    table = Table(title=f"Eval {eval} per benchmark")
+    table.add_column("Benchmark", justify="left")
+    for column in columns:
+        table.add_column(column.capitalize(), justify="right")
+    for benchmark, counts in benchmark_counts.items():
+        table.add_row(benchmark, *(str(counts.get(c, 0)) for c in columns))
+    return table
+
+
 def main(
     parser: argparse.ArgumentParser,
     argv: list[str],
@@ -44,18 +84,28 @@ def main(
             engine_eval = ENGINES[eval]
             eval_result = engine_eval(args.output)
 
+            # Total, Correct and Accuracy count benchmarks, the other columns are
+            # the sums of the per-benchmark counts
+            count_totals = eval_result.count_totals()
             table = Table(title=f"Eval {eval}")
             table.add_column("Total", justify="right")
             table.add_column("Correct", justify="right")
             table.add_column("Accuracy", justify="right")
+            for name in count_totals:
+                table.add_column(name.capitalize(), justify="right")
 
             table.add_row(
                 str(eval_result.get_total_count),
                 str(eval_result.get_correct_count),
-                f"{eval_result.accuracy:.2f}%",
+                f"{eval_result.accuracy:.2%}",
+                *(str(count) for count in count_totals.values()),
             )
 
-        console.print(table)
+            if eval_result.benchmark_counts:
+                console.print(_counts_table(eval, eval_result.benchmark_counts))
+            if eval_result.benchmarks:
+                console.print(_family_table(eval, eval_result))
+            console.print(table)
 
     else:
         parser.print_help()
@@ -1,264 +1,314 @@
 import argparse
+import asyncio
+import dataclasses
 import logging
-from datetime import datetime
-from itertools import product
-from time import sleep
-from typing import Literal, Union
+import threading
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from itertools import islice, product
+from time import monotonic, sleep
+from typing import Literal
 
 from rich.align import Align
-from rich.console import Console, ConsoleOptions, RenderResult
+from rich.console import Console, ConsoleOptions, Group, RenderableType, RenderResult
+from rich.filesize import decimal
 from rich.layout import Layout
 from rich.live import Live
 from rich.logging import RichHandler
-from rich.measure import Measurement
 from rich.panel import Panel
 from rich.spinner import Spinner
 from rich.table import Table
 from rich.text import Text
 
-from kaprese.core.benchmark import Benchmark, all_benchmarks
+from kaprese.core.benchmark import Benchmark, all_benchmarks, check_availability
+from kaprese.core.config import CONFIGURE
 from kaprese.core.engine import Engine
-from kaprese.core.runner import Runner
+from kaprese.core.hosts import (
+    DockerHost,
+    DockerHostPool,
+    parse_docker_host,
+    parse_docker_hosts,
+)
+from kaprese.core.journal import Journal
+from kaprese.core.plan import Plan, plan
+from kaprese.core.runner import AsyncRunner, LocalRunner, Runner
+from kaprese.core.store import OutputStore
 from kaprese.utils.console import PanelConsole, console
+from kaprese.utils.docker import (
+    docker_base_url,
+    docker_client_stats,
+    shares_filesystem,
+)
 from kaprese.utils.logging import DATE_FORMAT, FORMAT, logger
+from kaprese.utils.resources import ResourceUsage
+from kaprese.utils.tracing import span, tracing
+
+type _Status = Literal[
+    # Waiting
+    "Pending",
+    # Doing something
+    "Checking",
+    "Preparing",
+    "Running",
+    # Done
+    "Not supported",
+    "Failed preparing",
+    "Failed running",
+    "OK",
+    "Resumed",
+]
+
+_STATUSES: tuple[_Status, ...] = (
+    "Pending",
+    "Checking",
+    "Preparing",
+    "Running",
+    "Not supported",
+    "Failed preparing",
+    "Failed running",
+    "OK",
+    "Resumed",
+)
+_STATUS_STYLES: dict[_Status, str] = {
+    "Pending": "grey23",
+    "Checking": "yellow",
+    "Preparing": "yellow",
+    "Running": "yellow",
+    "Not supported": "grey23",
+    "Failed preparing": "red",
+    "Failed running": "red",
+    "OK": "green",
+    "Resumed": "dark_green",
+}
+# Spinners only depend on the time, so all rows in the same state share one
+_SPINNERS: dict[_Status, Spinner] = {
+    status: Spinner("dots", f"{status}...")
+    for status in ("Checking", "Preparing", "Running")
+}
+
+
+def _format_elapsed(seconds: float | None) -> Text:
+    if seconds is None:
+        return Text("n/a", style="grey23")
+    t, _, ms = str(timedelta(seconds=seconds)).partition(".")
+    return Text(f"{t}.{ms[:2] or '00'}")
 
 
-class _RunnerStatus:
-    def __init__(self) -> None:
-        self._status: Union[
-            # Waiting
-            Literal["Pending"],
-            # Doing something
-            Literal["Checking"],
-            Literal["Preparing"],
-            Literal["Running"],
-            # Done
-            Literal["Not supported"],
-            Literal["Failed preparing"],
-            Literal["Failed running"],
-            Literal["OK"],
-        ] = "Pending"
-        self._spinner = None
-
-    def check_start(self) -> None:
-        self._status = "Checking"
-        self._spinner = Spinner("dots", "Checking...")
-
-    def check_done(self, passed: bool) -> None:
-        self._status = "Pending" if passed else "Not supported"
-        self._spinner = None
-
-    def prepare_start(self) -> None:
-        self._status = "Preparing"
-        self._spinner = Spinner("dots", "Preparing...")
-
-    def prepare_done(self, done: bool) -> None:
-        self._status = "Pending" if done else "Failed preparing"
-        self._spinner = None
-
-    def run_start(self) -> None:
-        self._status = "Running"
-        self._spinner = Spinner("dots", "Running...")
-
-    def run_done(self, result: bool) -> None:
-        self._status = "OK" if result else "Failed running"
-        self._spinner = None
-
-    def __rich_console__(
-        self, console: Console, options: ConsoleOptions
-    ) -> RenderResult:
-        if self._status == "Pending" or self._status == "Not supported":
-            yield Text(self._status, style="grey23")
-        elif (
-            self._status == "Running"
-            or self._status == "Checking"
-            or self._status == "Preparing"
-        ):
-            yield (
-                self._spinner.render(console.get_time())
-                if self._spinner is not None
-                else f"{self._status}..."
-            )
-        elif self._status == "OK":
-            yield Text(self._status, style="green")
-        else:
-            yield Text(self._status, style="red")
-
-    def __rich_measure__(
-        self, console: Console, options: ConsoleOptions
-    ) -> Measurement:
-        if (
-            self._status == "Running"
-            or self._status == "Checking"
-            or self._status == "Preparing"
-        ):
-            return Measurement(len(self._status) + 5, len(self._status) + 5)
-        else:
-            return Measurement(len(self._status), len(self._status))
-
-
-class _TextCell:
-    def __init__(self) -> None:
-        self.text = None
-
-    def __rich_console__(
-        self, console: Console, options: ConsoleOptions
-    ) -> RenderResult:
-        yield Text(self.text) if self.text is not None else Text("n/a", style="grey23")
-
-    def __rich_measure__(
-        self, console: Console, options: ConsoleOptions
-    ) -> Measurement:
-        return (
-            Measurement(len(self.text), len(self.text))
-            if self.text is not None
-            else Measurement(3, 3)
-        )
-
-    def set_text(self, text: str) -> None:
-        self.text = text
-
-
-class _Timer:
-    def __init__(self) -> None:
-        self.start_time = None
-        self.elapsed_time = None
+class _SummaryRow:
+    # Rows exist for every pair of the run matrix, keep them small
+    __slots__ = (
+        "_table",
+        "index",
+        "engine",
+        "benchmark",
+        "status",
+        "output_dir",
+        "start_time",
+        "end_time",
+        "memory_peak",
+        "cpu_seconds",
+    )
 
-    def __rich_console__(
-        self, console: Console, options: ConsoleOptions
-    ) -> RenderResult:
-        elapsed = self._elapsed
-        if elapsed is None:
-            yield Text("n/a", style="grey23")
-        else:
-            yield Text(elapsed)
+    def __init__(
+        self, table: "_SummaryTable", index: int, engine: str, benchmark: str
+    ) -> None:
+        self._table = table
+        self.index = index
+        self.engine = engine
+        self.benchmark = benchmark
+        self.status: _Status = "Pending"
+        self.output_dir: str | None = None
+        self.start_time: float | None = None
+        self.end_time: float | None = None
+        self.memory_peak: int | None = None
+        self.cpu_seconds: float | None = None
 
-    def __rich_measure__(
-        self, console: Console, options: ConsoleOptions
-    ) -> Measurement:
-        elapsed = self._elapsed
-        if elapsed is None:
-            return Measurement(3, 3)
-        else:
-            size = len(elapsed)
-            return Measurement(size, size)
-
-    def start_timer(self) -> None:
-        self.start_time = datetime.now()
-
-    def stop_timer(self) -> None:
-        self.elapsed_time = (
-            (datetime.now() - self.start_time) if self.start_time is not None else None
-        )
+    def _set_status(self, status: _Status) -> None:
+        self._table._transition(self, status)
 
     @property
-    def _elapsed(self) -> str | None:
-        elapsed = (
-            self.elapsed_time
-            if self.elapsed_time is not None
-            else (
-                datetime.now() - self.start_time
-                if self.start_time is not None
-                else None
-            )
-        )
-        if elapsed is None:
+    def elapsed_time(self) -> float | None:
+        if self.start_time is None:
             return None
-        else:
-            t, ms = str(elapsed).split(".")
-            return f"{t}.{ms[:2]}"
-
-
-class _SummaryRow:
-    def __init__(self, engine: str, benchmark: str) -> None:
-        self.engine = engine
-        self.benchmark = benchmark
-        self.status = _RunnerStatus()
-        self.output_dir = _TextCell()
-        self.elapsed_time = _Timer()
+        return (self.end_time or monotonic()) - self.start_time
 
     # check
 
     def check_start(self):
-        self.status.check_start()
+        self._set_status("Checking")
 
     def check_done(self, passed: bool):
-        self.status.check_done(passed)
+        self._set_status("Pending" if passed else "Not supported")
 
     # prepare
 
     def prepare_start(self):
-        self.status.prepare_start()
+        self._set_status("Preparing")
 
     def prepare_done(self, done: bool):
-        self.status.prepare_done(done)
+        self._set_status("Pending" if done else "Failed preparing")
 
     # run
 
     def run_start(self, output_dir: str):
-        self.status.run_start()
-        self.output_dir.set_text(output_dir)
-        self.elapsed_time.start_timer()
+        self.output_dir = output_dir
+        self.start_time = monotonic()
+        self._set_status("Running")
+
+    def run_done(self, result: bool, resources: ResourceUsage | None = None):
+        self.end_time = monotonic()
+        if resources is not None and resources.samples > 0:
+            self.memory_peak = resources.memory_peak
+            self.cpu_seconds = resources.cpu_seconds
+        self._set_status("OK" if result else "Failed running")
 
-    def run_done(self, result: bool):
-        self.status.run_done(result)
-        self.elapsed_time.stop_timer()
+    # resume
+
+    def resumed(self, output_dir: str):
+        self.output_dir = output_dir
+        self._set_status("Resumed")
+
+    def cells(self, console: Console) -> tuple[RenderableType, ...]:
+        spinner = _SPINNERS.get(self.status)
+        return (
+            str(self.index),
+            self.engine,
+            self.benchmark,
+            (
+                spinner.render(console.get_time())
+                if spinner is not None
+                else Text(self.status, style=_STATUS_STYLES[self.status])
+            ),
+            (
+                Text(self.output_dir)
+                if self.output_dir is not None
+                else Text("n/a", style="grey23")
+            ),
+            _format_elapsed(self.elapsed_time),
+            (
+                Text(decimal(self.memory_peak))
+                if self.memory_peak is not None
+                else Text("n/a", style="grey23")
+            ),
+            (
+                Text(f"{self.cpu_seconds:.1f}s")
+                if self.cpu_seconds is not None
+                else Text("n/a", style="grey23")
+            ),
+        )
 
 
 class _SummaryTable:
-    def __init__(self, title: str = "kaprese running summary") -> None:
+    """Summary of the run matrix, only the visible rows are rendered"""
+
+    def __init__(
+        self, title: str = "kaprese running summary", recent: int = 200
+    ) -> None:
         self._title = title
-        self._rows: list[tuple[str, _SummaryRow]] = []
+        self._rows: list[_SummaryRow] = []
+        self._counts: Counter[_Status] = Counter()
+        # Rows being checked, prepared or run, and the latest finished ones
+        self._active: dict[int, _SummaryRow] = {}
+        self._recent: deque[_SummaryRow] = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
 
     def add_row(
         self,
         engine: str,
         benchmark: str,
     ) -> _SummaryRow:
-        row = _SummaryRow(engine, benchmark)
-        self._rows.append((str(len(self._rows) + 1), row))
+        with self._lock:
+            row = _SummaryRow(self, len(self._rows) + 1, engine, benchmark)
+            self._rows.append(row)
+            self._counts[row.status] += 1
         return row
 
-    def __rich_console__(
-        self, console: Console, options: ConsoleOptions
-    ) -> RenderResult:
-        table = Table(title="kaprese running summary")
+    def _transition(self, row: _SummaryRow, status: _Status) -> None:
+        with self._lock:
+            self._counts[row.status] -= 1
+            self._counts[status] += 1
+            row.status = status
+            if status in _SPINNERS:
+                self._active[row.index] = row
+            elif self._active.pop(row.index, None) is not None and status != "Pending":
+                self._recent.append(row)
+
+    def _make_table(self, title: str | None = None) -> Table:
+        table = Table(title=title or self._title)
         table.add_column("#", justify="right")
         table.add_column("Engine", justify="left")
         table.add_column("Benchmark", justify="left")
         table.add_column("Status", justify="left")
         table.add_column("Output directory", justify="left")
         table.add_column("Elapsed time", justify="left")
-        for idx, row in self._rows[-(options.max_height - 5) :]:
-            table.add_row(
-                idx,
-                row.engine,
-                row.benchmark,
-                row.status,
-                row.output_dir,
-                row.elapsed_time,
-            )
-        yield table
+        table.add_column("Peak memory", justify="right")
+        table.add_column("CPU time", justify="right")
+        return table
 
     @property
-    def full_table(self) -> Table:
-        table = Table(title=self._title)
-        table.add_column("#", justify="right")
-        table.add_column("Engine", justify="left")
-        table.add_column("Benchmark", justify="left")
-        table.add_column("Status", justify="left")
-        table.add_column("Output directory", justify="left")
-        table.add_column("Elapsed time", justify="left")
-        for idx, row in self._rows:
-            table.add_row(
-                idx,
-                row.engine,
-                row.benchmark,
-                row.status,
-                row.output_dir,
-                row.elapsed_time,
+    def counters(self) -> Text:
+        with self._lock:
+            counts = self._counts.copy()
+        text = Text(f"{len(self._rows)} pairs: ")
+        text.append_text(
+            Text(", ").join(
+                Text(f"{status} {counts[status]}", style=_STATUS_STYLES[status])
+                for status in _STATUSES
+                if counts[status] > 0
             )
-        return table
+        )
+        return text
+
+    def _visible_rows(self, height: int) -> list[_SummaryRow]:
+        with self._lock:
+            rows = list(islice(self._active.values(), height))
+            if (left := height - len(rows)) > 0:
+                rows.extend(list(self._recent)[-left:])
+        return sorted(rows, key=lambda row: row.index)
+
+    def __rich_console__(
+        self, console: Console, options: ConsoleOptions
+    ) -> RenderResult:
+        # Title, header, borders and counters take 7 lines
+        height = max((options.max_height or options.size.height) - 7, 1)
+        table = self._make_table()
+        for row in self._visible_rows(height):
+            table.add_row(*row.cells(console))
+        yield Group(table, Align.center(self.counters))
+
+    def pages(self, page_size: int) -> Iterator[Table]:
+        """Render all rows, `page_size` rows per table"""
+        total = len(self._rows)
+        for start in range(0, total, page_size):
+            rows = self._rows[start : start + page_size]
+            table = self._make_table(
+                f"{self._title} ({start + 1}-{start + len(rows)} of {total})"
+            )
+            for row in rows:
+                table.add_row(*row.cells(console))
+            yield table
+
+
+def _plan_table(run_plan: Plan) -> Table:
+    table = Table(title="kaprese run plan")
+    table.add_column("Engine", justify="left")
+    table.add_column("Runnable", justify="right")
+    table.add_column("Unsupported", justify="right")
+    table.add_column("Not pulled yet", justify="right")
+    for engine, counts in run_plan.counts().items():
+        table.add_row(
+            engine,
+            str(counts["runnable"]),
+            str(counts["unsupported"]),
+            str(counts["unresolved"]),
+        )
+    return table
 
 
 def main(
@@ -280,7 +330,7 @@ def main(
     parser.add_argument(
         "--rebuild-runner",
         action="store_true",
-        help="rebuild runner image",
+        help="rebuild runner image unless it was built from the same inputs",
     )
     parser.add_argument(
         "-o",
@@ -288,6 +338,91 @@ def main(
         default="kaprese-out",
         help="output directory (default=%(default)s)",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip pairs that already finished successfully in the output directory",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["docker", "async", "local"],
+        default="docker",
+        help="run engines in containers (one thread per pair, or all pairs on one "
+        "asyncio event loop) or as local processes (default=%(default)s)",
+    )
+    parser.add_argument(
+        "--local-sources",
+        default=None,
+        metavar="DIR",
+        help="directory of benchmark sources (DIR/<benchmark>) for the local backend",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="number of engine/benchmark pairs to run concurrently (default=1, or the capacity of the Docker hosts)",
+    )
+    parser.add_argument(
+        "--docker-host",
+        action="append",
+        default=[],
+        metavar="URL[=N]",
+        help="Docker daemon to run up to N pairs on, may be repeated (default=DOCKER_HOSTS config)",
+    )
+    parser.add_argument(
+        "--compress-output",
+        action="store_true",
+        help="gzip the raw output of engines (output.log.gz)",
+    )
+    parser.add_argument(
+        "--rotate-output",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="rotate the raw output of engines every MB megabytes",
+    )
+    parser.add_argument(
+        "--output-sample-interval",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="forward at most one output line per interval to the logs (default=%(default)s)",
+    )
+    parser.add_argument(
+        "--dedup-output",
+        action="store_true",
+        help="keep identical output files once, linked from a store in the output directory",
+    )
+    parser.add_argument(
+        "--sample-resources",
+        action="store_true",
+        help="record CPU, memory, block I/O and PIDs of engines (resources.csv)",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        metavar="FILE",
+        help="write a timeline of the run in Chrome trace format (see ui.perfetto.dev)",
+    )
+    parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="exit once all pairs are done instead of waiting for Ctrl+C",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only show which pairs would run (docker backend with a single host)",
+    )
+    parser.add_argument(
+        "--summary-page-size",
+        type=int,
+        default=1000,
+        metavar="N",
+        help="rows per page of the final summary (default=%(default)s)",
+    )
     parser.add_argument(
         "-e",
         "--engine",
@@ -311,7 +446,31 @@ def main(
 
     # Branching to pass type checking
     args = parser.parse_args(argv, namespace=args) if args else parser.parse_args(argv)
+    if args.backend == "local" and args.local_sources is None:
+        parser.error("--backend local requires --local-sources")
+    try:
+        hosts = (
+            [parse_docker_host(spec) for spec in args.docker_host]
+            if args.docker_host
+            else parse_docker_hosts(CONFIGURE.DOCKER_HOSTS or "")
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.backend == "async" and (hosts or not shares_filesystem(docker_base_url())):
+        parser.error("--backend async runs on a single local Docker daemon")
+
+    # Opened before any work, so the trace is terminated whenever the run stops
+    with ExitStack() as trace:
+        if args.trace is not None:
+            trace.enter_context(tracing(args.trace))
+        _run(args, hosts, trace)
+
 
+def _run(
+    args: argparse.Namespace,
+    hosts: list[DockerHost],
+    trace: ExitStack,
+) -> None:
     engines: list[Engine] = []
     for engine_name in args.engine:
         engine = Engine.load(engine_name)
@@ -339,6 +498,35 @@ def main(
         logger.warning("No engine or benchmark to run")
         return
 
+    local = args.backend == "local"
+    asynchronous = args.backend == "async"
+    if local and args.sample_resources:
+        logger.warning("Resources are only sampled from containers, ignored")
+    pool = DockerHostPool(hosts) if hosts and not local else None
+    jobs = args.jobs or (pool.capacity if pool is not None else 1)
+
+    # Resolve availability and metadata of all benchmarks at once, so unsupported
+    # pairs are dropped before running and the checks below hit the cache
+    # Each host of a pool has its own images, they are checked pair by pair
+    if not local and pool is None:
+        with (
+            console.status("[bold green]Checking availability of benchmarks"),
+            span("check availability"),
+        ):
+            check_availability(benchmarks)
+        with (
+            console.status("[bold green]Resolving metadata of benchmarks"),
+            span("plan"),
+        ):
+            run_plan = plan(engines, benchmarks)
+        console.print(_plan_table(run_plan))
+    else:
+        run_plan = Plan(pairs=list(product(engines, benchmarks)))
+    if args.dry_run:
+        if local or pool is not None:
+            console.print("Pairs are only planned for the docker backend with one host")
+        return
+
     layout = Layout()
     layout.split(
         Layout(name="main", ratio=1),
@@ -358,52 +546,225 @@ def main(
     logger.addHandler(handler)
     layout["log"].update(Panel(pannel_console, title="logs"))
 
-    with Live(layout, console=console, screen=True, refresh_per_second=12.5):
-        for engine, bench in product(engines, benchmarks):
-            # Make row in summary table
-            row = table.add_row(engine.name, bench.name)
+    store = OutputStore(args.output) if args.dedup_output else None
 
-            # Start checking
-            row.check_start()
-            if not bench.availability:
-                logger.info(
-                    'Benchmark "%s" is not available, try to prepare it', bench.name
-                )
-                bench.prepare()
-                bench.save()
-            support_check = engine.support(bench)
-            row.check_done(support_check)
-            if not support_check:
-                logger.warning(
-                    'Engine "%s" does not support benchmark "%s"',
-                    engine.name,
-                    bench.name,
-                )
-                continue
+    # Benchmarks are shared among engines, check and prepare each one only once at a
+    # time on each Docker daemon
+    bench_locks: defaultdict[tuple[str | None, str], threading.Lock] = defaultdict(
+        threading.Lock
+    )
 
-            # Start preparing
-            row.prepare_start()
-            runner = Runner(bench, engine, args.output, args.extra_args)
+    def check_pair(engine: Engine, bench: Benchmark, row: _SummaryRow) -> bool:
+        pair = {"engine": engine.name, "benchmark": bench.name}
+        row.check_start()
+        with span("check", **pair), bench_locks[(docker_base_url(), bench.name)]:
+            if local:
+                support_check = LocalRunner.supports(engine, bench, args.local_sources)
+            else:
+                if not bench.availability:
+                    logger.info(
+                        'Benchmark "%s" is not available, try to prepare it',
+                        bench.name,
+                    )
+                    bench.prepare()
+                    bench.save()
+                support_check = engine.support(bench)
+        row.check_done(support_check)
+        journal.record(engine.name, bench.name, "check", support_check)
+        if not support_check:
+            logger.warning(
+                'Engine "%s" does not support benchmark "%s"',
+                engine.name,
+                bench.name,
+            )
+        return support_check
+
+    def make_runner(engine: Engine, bench: Benchmark) -> Runner:
+        runner_options = dict(
+            compress_output=args.compress_output,
+            output_max_bytes=(
+                args.rotate_output * 1024 * 1024 if args.rotate_output else None
+            ),
+            output_sample_interval=args.output_sample_interval,
+            sample_resources=args.sample_resources,
+        )
+        if local:
+            return LocalRunner(
+                bench,
+                engine,
+                args.output,
+                args.extra_args,
+                sources=args.local_sources,
+                **runner_options,
+            )
+        runner_class = AsyncRunner if asynchronous else Runner
+        return runner_class(
+            bench, engine, args.output, args.extra_args, **runner_options
+        )
+
+    def record_run(
+        engine: Engine,
+        bench: Benchmark,
+        row: _SummaryRow,
+        runner: Runner,
+        result: bool,
+    ) -> None:
+        row.run_done(result, runner.resources)
+        journal.record(
+            engine.name,
+            bench.name,
+            "run",
+            result,
+            return_code=runner.return_code,
+            elapsed=(
+                runner.elapsed_time.total_seconds()
+                if runner.elapsed_time is not None
+                else None
+            ),
+        )
+        if store is not None:
+            with span("dedup", engine=engine.name, benchmark=bench.name):
+                store.add(runner.output_dir)
+
+    def run_pair(engine: Engine, bench: Benchmark, row: _SummaryRow) -> None:
+        pair = {"engine": engine.name, "benchmark": bench.name}
+
+        # Start checking
+        if not check_pair(engine, bench, row):
+            return
+
+        # Start preparing
+        row.prepare_start()
+        runner = make_runner(engine, bench)
+        with span("prepare", **pair):
             prepared = runner.prepare(force=args.rebuild_runner)
+        row.prepare_done(prepared)
+        journal.record(engine.name, bench.name, "prepare", prepared)
+        if not prepared:
+            return
+
+        # Start running
+        logger.info('Running "%s" on "%s"', bench.name, engine.name)
+        row.run_start(str(runner.output_dir))
+
+        # Actual run
+        with span("run", **pair):
+            result = runner.run(delete_runner=args.delete_runner)
+
+        # Finish running
+        record_run(engine, bench, row, runner, result)
+
+    async def run_pair_async(
+        engine: Engine,
+        bench: Benchmark,
+        row: _SummaryRow,
+        slots: asyncio.Semaphore,
+    ) -> None:
+        pair = {"engine": engine.name, "benchmark": bench.name}
+        async with slots:
+            # Checks may pull the benchmark with docker-py, keep them off the loop
+            if not await asyncio.to_thread(check_pair, engine, bench, row):
+                return
+
+            row.prepare_start()
+            runner = make_runner(engine, bench)
+            assert isinstance(runner, AsyncRunner)
+            with span("prepare", **pair):
+                prepared = await runner.prepare(force=args.rebuild_runner)
             row.prepare_done(prepared)
+            journal.record(engine.name, bench.name, "prepare", prepared)
             if not prepared:
-                continue
+                return
 
-            # Start running
             logger.info('Running "%s" on "%s"', bench.name, engine.name)
             row.run_start(str(runner.output_dir))
+            with span("run", **pair):
+                result = await runner.run(delete_runner=args.delete_runner)
+            record_run(engine, bench, row, runner, result)
+
+    async def run_pairs_async(
+        pending: list[tuple[Engine, Benchmark, _SummaryRow]],
+    ) -> None:
+        slots = asyncio.Semaphore(max(jobs, 1))
+        async with asyncio.TaskGroup() as group:
+            for engine, bench, row in pending:
+                group.create_task(run_pair_async(engine, bench, row, slots))
+
+    def run_on_host(engine: Engine, bench: Benchmark, row: _SummaryRow) -> None:
+        if pool is None:
+            return run_pair(engine, bench, row)
+        with pool.acquire() as host:
+            logger.info(
+                'Running "%s" on "%s" on Docker host "%s"',
+                bench.name,
+                engine.name,
+                host.base_url,
+            )
+            # Availability and probed metadata depend on the host, so hosts must not
+            # reset them on a benchmark other hosts are reading
+            run_pair(engine, dataclasses.replace(bench), row)
+
+    with (
+        Live(layout, console=console, screen=True, refresh_per_second=12.5),
+        Journal(args.output) as journal,
+    ):
+        finished = journal.finished() if args.resume else set()
+        with trace:
+            # Rows of the whole matrix are made upfront, so pending pairs are counted
+            pending: list[tuple[Engine, Benchmark, _SummaryRow]] = []
+            for engine, bench in run_plan.unsupported:
+                journal.record(engine.name, bench.name, "check", False)
+            for engine, bench in run_plan.pairs:
+                row = table.add_row(engine.name, bench.name)
+                if (engine.name, bench.name) in finished:
+                    row.resumed(f"{args.output}/{engine.name}/{bench.name}")
+                    continue
+                pending.append((engine, bench, row))
+            if finished:
+                logger.info(
+                    "Resuming from %s: %d pairs already finished",
+                    journal.path,
+                    len(table) - len(pending),
+                )
+            if asynchronous:
+                asyncio.run(run_pairs_async(pending))
+            else:
+                with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+                    futures = [
+                        executor.submit(run_on_host, engine, bench, row)
+                        for engine, bench, row in pending
+                    ]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except BaseException:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        raise
+
+        if not local:
+            stats = docker_client_stats()
+            logger.info(
+                "Docker client: %d requests over %d connections (%d reused)",
+                stats.http_requests,
+                stats.connections_opened,
+                stats.connections_reused,
+            )
 
-            # Actual run
-            result = runner.run(delete_runner=args.delete_runner)
-
-            # Finish running
-            row.run_done(result)
-
-        pannel_console.print(":party_popper: Done! Press Ctrl+C to exit.")
-        try:
-            while True:
-                sleep(1)
-        except KeyboardInterrupt:
-            pass
+        if not args.no_wait:
+            pannel_console.print(":party_popper: Done! Press Ctrl+C to exit.")
+            try:
+                while True:
+                    sleep(1)
+            except KeyboardInterrupt:
+                pass
     console.clear()
-    console.print(table.full_table)
+    page_size = max(args.summary_page_size, 1)
+    if console.is_terminal and len(table) > page_size:
+        with console.pager(styles=True):
+            for page in table.pages(page_size):
+                console.print(page)
+            console.print(table.counters)
+    else:
+        for page in table.pages(page_size):
+            console.print(page)
+        console.print(table.counters)
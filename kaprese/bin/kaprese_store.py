@@ -0,0 +1,80 @@
+import argparse
+import sys
+from pathlib import Path
+
+from kaprese.core.store import STORE_DIR, OutputStore, StoreStats
+
+
+def main(
+    parser: argparse.ArgumentParser,
+    argv: list[str],
+    args: argparse.Namespace,
+) -> None:
+    parser.add_argument(
+        "-h", "--help", action="help", help="show this help message and exit"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="kaprese-out",
+        help="output directory (default=%(default)s)",
+    )
+
+    subparsers = parser.add_subparsers(dest="subcommand", metavar="<command>")
+
+    add_parser = subparsers.add_parser(
+        "add", help="deduplicate the outputs of finished runs"
+    )
+    add_parser.add_argument(
+        "-e",
+        "--engine",
+        nargs="*",
+        default=[],
+        help="engine whose outputs to add (default=all)",
+    )
+
+    gc_parser = subparsers.add_parser("gc", help="delete unreferenced output files")
+    gc_parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="only report what would be deleted",
+    )
+
+    # Branching to pass type checking
+    args = parser.parse_args(argv, namespace=args) if args else parser.parse_args(argv)
+
+    from kaprese.utils.console import console
+
+    store = OutputStore(args.output)
+
+    if args.subcommand == "add":
+        # Only the directories of runs, files of kaprese itself are still written to
+        output = Path(args.output)
+        if not output.is_dir():
+            console.print(f"No output directory {output}")
+            sys.exit(1)
+        engine_dirs = (
+            [output / engine for engine in args.engine]
+            if args.engine
+            else [d for d in output.iterdir() if d.is_dir() and d.name != STORE_DIR]
+        )
+        stats = StoreStats()
+        for engine_dir in engine_dirs:
+            for run_dir in sorted(d for d in engine_dir.iterdir() if d.is_dir()):
+                stats += store.add(run_dir)
+        console.print(
+            f"{stats.files} files stored, {stats.deduplicated} deduplicated, "
+            f"{stats.bytes_saved} bytes saved"
+        )
+
+    elif args.subcommand == "gc":
+        blobs, freed = store.gc(dry_run=args.dry_run)
+        console.print(
+            f"{blobs} unreferenced files ({freed} bytes) "
+            + ("would be deleted" if args.dry_run else "deleted")
+        )
+
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -2,27 +2,37 @@ from __future__ import annotations
 
 import dataclasses
 import json
-from pathlib import Path
+import posixpath
+import re
+from collections.abc import Iterable, Iterator
 
-from kaprese.core.config import CONFIGURE
-from kaprese.utils.docker import delete_image as docker_delete_image
-from kaprese.utils.docker import image_exists, pull_image, run_command
+from kaprese.core.registry import get_registry
+from kaprese.utils.docker import (
+    PullProgressCallback,
+    delete_image as docker_delete_image,
+    image_exists,
+    images_exist,
+    pull_image,
+    read_image_files,
+    run_command,
+)
 from kaprese.utils.logging import logger
 
 
-def _get_benchmark_path() -> Path:
-    return CONFIGURE.CONFIG_PATH / "benchmarks"
-
-
 @dataclasses.dataclass
 class Benchmark:
     name: str
     image: str
     language_command: str | None = dataclasses.field(default=None, repr=False)
     workdir_command: str | None = dataclasses.field(default=None, repr=False)
+    # JSON file in the image (relative to its workdir) with "language" and "buggyPath"
+    metadata_file: str | None = dataclasses.field(default=None, repr=False)
+    # Family the benchmark was made from, if any (see BenchmarkFamily)
+    family: str | None = dataclasses.field(default=None, repr=False)
 
     # Internal fields, you may set them manually rather than providing commands
     _availability: bool = dataclasses.field(default=False, repr=False, init=False)
+    _probed: bool = dataclasses.field(default=False, repr=False, init=False)
     _language: str | None = None
     _os: str | None = dataclasses.field(default=None, repr=False)
     _workdir: str | None = dataclasses.field(default=None, repr=False)
@@ -30,14 +40,16 @@ class Benchmark:
     @property
     def availability(self) -> bool:
         availability = image_exists(self.image)
+        # Only in memory, the registry is written by explicit saves
         if not availability:
             self.cleanup()
-            self.register(overwrite=True)
         self._availability = availability
         return self._availability
 
     @property
     def language(self) -> str | None:
+        if self._language is None and self.availability:
+            self.probe()
         if self._language is None and self.availability:
             out = run_command(self.image, self.language_command)
             if out is not None:
@@ -47,6 +59,8 @@ class Benchmark:
 
     @property
     def workdir(self) -> str | None:
+        if self._workdir is None and self.availability:
+            self.probe()
         if self._workdir is None and self.availability:
             out = run_command(self.image, self.workdir_command)
             if out is not None:
@@ -56,18 +70,48 @@ class Benchmark:
 
     @property
     def os(self) -> str | None:
+        if self._os is None and self.availability:
+            self.probe()
         if self._os is None and self.availability:
             out = run_command(self.image, "cat /etc/os-release")
             if out is not None:
-                out = out.strip()
-                data = {
-                    key.strip('"'): value.strip('"')
-                    for key, value in [line.split("=") for line in out.split("\n")]
-                }
-                out = f"{data['ID']}:{data['VERSION_ID']}"
+                out = _parse_os_release(out)
             self._os = out
         return self._os
 
+    def probe(self) -> None:
+        """Fill language, workdir and os from the image filesystem in one pass"""
+        if self._probed or not self.availability:
+            return
+        self._probed = True
+        paths = ["/etc/os-release"]
+        if self.metadata_file is not None:
+            paths.append(self.metadata_file)
+        image_files = read_image_files(self.image, paths)
+        if image_files is None:
+            return
+
+        os_release = image_files.files.get("/etc/os-release")
+        if self._os is None and os_release is not None:
+            self._os = _parse_os_release(os_release.decode())
+
+        if self.metadata_file is None:
+            return
+        raw_metadata = image_files.files.get(self.metadata_file)
+        if raw_metadata is None:
+            return
+        try:
+            metadata = json.loads(raw_metadata)
+        except json.JSONDecodeError:
+            logger.debug(f'Broken metadata file of benchmark "{self.name}"')
+            return
+        if self._language is None:
+            self._language = metadata.get("language")
+        if self._workdir is None and (buggy_path := metadata.get("buggyPath")):
+            self._workdir = posixpath.normpath(
+                posixpath.join(image_files.workdir, buggy_path)
+            )
+
     def prepare(self, *, force: bool = False) -> None:
         if not self.availability or force:
             self.pull(force=force)
@@ -76,72 +120,213 @@ class Benchmark:
             self.workdir
             self.os
 
-    def pull(self, *, force: bool = False) -> None:
+    def pull(
+        self,
+        *,
+        force: bool = False,
+        progress: PullProgressCallback | None = None,
+    ) -> None:
         if not self.availability or force:
-            pull_image(self.image)
+            pull_image(self.image, progress=progress)
 
     def cleanup(self, *, delete_image: bool = False) -> None:
         logger.debug(f'Cleaning up benchmark "{self.name}"')
-        if self.language_command is not None:
+        if self.language_command is not None or self.metadata_file is not None:
             self._language = None
-        if self.workdir_command is not None:
+        if self.workdir_command is not None or self.metadata_file is not None:
             self._workdir = None
         if delete_image and self.availability:
             docker_delete_image(self.image)
         self._availability = False
+        self._probed = False
         self._os = None
 
-    @property
-    def _file(self) -> Path:
-        return _get_benchmark_path() / f"{self.name}.json"
-
     def register(self, *, overwrite: bool = False) -> None:
-        if self._file.exists() and not overwrite:
+        if not get_registry().insert("benchmarks", self._dump(), overwrite=overwrite):
             logger.error(f"Benchmark {self.name} already exists")
-            return
-        self._create_file()
-
-    def _create_file(self) -> None:
-        self._file.parent.mkdir(parents=True, exist_ok=True)
-        self._file.touch(exist_ok=True)
-        self.save()
 
     def unregister(self, *, delete_image: bool = False) -> None:
         self.cleanup(delete_image=delete_image)
-        self._delete_file()
-
-    def _delete_file(self) -> None:
-        benchmark_file = self._file
-        if not benchmark_file.exists():
+        deleted = get_registry().delete("benchmarks", self.name)
+        # Members of a family are kept from being made again
+        if self.family is not None and (family := BenchmarkFamily.load(self.family)):
+            deleted = family.exclude(self.name) or deleted
+        if not deleted:
             logger.error(f'Benchmark "{self.name}" does not exist')
-            return
-        benchmark_file.unlink()
 
     @classmethod
     def load(cls, name: str) -> Benchmark | None:
-        benchmark_file = _get_benchmark_path() / f"{name}.json"
-        if not benchmark_file.exists():
-            return None
-        return cls(**json.loads(benchmark_file.read_text()))
+        data = get_registry().get("benchmarks", name)
+        if data is None:
+            return BenchmarkFamily.find_member(name)
+        return cls(**data)
 
     def save(self) -> None:
-        benchmark_json = self._file
-        if not benchmark_json.exists():
+        if self.family is not None:
+            # Members of a family are stored from their first save on
+            get_registry().insert("benchmarks", self._dump(), overwrite=True)
+        elif not get_registry().update("benchmarks", self._dump()):
             logger.error(f'Benchmark "{self.name}" does not exist')
-            return
+
+    def _dump(self) -> dict[str, str | None]:
         benchmark = dataclasses.asdict(self)
         del benchmark["_availability"]
-        benchmark_json.write_text(json.dumps(benchmark))
-
-
-def all_benchmarks(path: Path | None = None) -> list[Benchmark]:
-    path = path or _get_benchmark_path()
-    return (
-        [
-            benchmark
-            for benchmark_file in path.glob("*.json")
-            if (benchmark := Benchmark.load(benchmark_file.stem)) is not None
-        ]
-        if path.exists()
-        else []
+        del benchmark["_probed"]
+        return benchmark
+
+
+def all_benchmarks(
+    *,
+    language: str | None = None,
+    os: str | None = None,
+    image: str | None = None,
+) -> list[Benchmark]:
+    benchmarks = {
+        data["name"]: Benchmark(**data)
+        for data in get_registry().find(
+            "benchmarks", language=language, os=os, image=image
+        )
+    }
+    # Members never saved have no language or os to match yet
+    if language is None and os is None:
+        for family in all_families():
+            for benchmark in family.expand():
+                if benchmark.name in benchmarks:
+                    continue
+                if image is None or benchmark.image == image:
+                    benchmarks[benchmark.name] = benchmark
+    return [benchmarks[name] for name in sorted(benchmarks)]
+
+
+@dataclasses.dataclass
+class BenchmarkFamily:
+    """Benchmarks numbered over a range, sharing their image and probe templates
+
+    Only the family is stored. Its members are made when loaded or listed, by
+    replacing "{index}" in the templates, and stored once they are saved.
+    """
+
+    name: str
+    name_template: str
+    image_template: str
+    # Indices of the members, as range(start, stop)
+    start: int
+    stop: int
+    language_command: str | None = dataclasses.field(default=None, repr=False)
+    workdir_command: str | None = dataclasses.field(default=None, repr=False)
+    metadata_file: str | None = dataclasses.field(default=None, repr=False)
+    # Indices of unregistered members
+    excluded: list[int] = dataclasses.field(default_factory=list, repr=False)
+
+    def __post_init__(self) -> None:
+        self._pattern = re.compile(
+            re.escape(self.name_template).replace(
+                re.escape("{index}"), r"(?P<index>\d+)"
+            )
+        )
+
+    def indices(self) -> Iterator[int]:
+        excluded = set(self.excluded)
+        return (i for i in range(self.start, self.stop) if i not in excluded)
+
+    def index_of(self, name: str) -> int | None:
+        match = self._pattern.fullmatch(name)
+        if match is None:
+            return None
+        index = int(match.group("index"))
+        if (
+            not self.start <= index < self.stop
+            or index in self.excluded
+            or self.name_template.format(index=index) != name
+        ):
+            return None
+        return index
+
+    def member(self, index: int) -> Benchmark:
+        return Benchmark(
+            self.name_template.format(index=index),
+            self.image_template.format(index=index),
+            language_command=self.language_command,
+            workdir_command=self.workdir_command,
+            metadata_file=self.metadata_file,
+            family=self.name,
+        )
+
+    def expand(self) -> Iterator[Benchmark]:
+        return (self.member(i) for i in self.indices())
+
+    def exclude(self, name: str) -> bool:
+        if (index := self.index_of(name)) is None:
+            return False
+        self.excluded.append(index)
+        self.save()
+        return True
+
+    def register(self, *, overwrite: bool = False) -> None:
+        register_families([self], overwrite=overwrite)
+
+    def unregister(self, *, delete_image: bool = False) -> None:
+        registry = get_registry()
+        for benchmark in self.expand():
+            if delete_image:
+                benchmark.cleanup(delete_image=True)
+            registry.delete("benchmarks", benchmark.name)
+        if not registry.delete("families", self.name):
+            logger.error(f'Benchmark family "{self.name}" does not exist')
+
+    @classmethod
+    def load(cls, name: str) -> BenchmarkFamily | None:
+        data = get_registry().get("families", name)
+        if data is None:
+            return None
+        return cls(**data)
+
+    @classmethod
+    def find_member(cls, name: str) -> Benchmark | None:
+        for family in all_families():
+            if (index := family.index_of(name)) is not None:
+                return family.member(index)
+        return None
+
+    def save(self) -> None:
+        if not get_registry().update("families", dataclasses.asdict(self)):
+            logger.error(f'Benchmark family "{self.name}" does not exist')
+
+
+def all_families() -> list[BenchmarkFamily]:
+    return [BenchmarkFamily(**data) for data in get_registry().find("families")]
+
+
+def register_families(
+    families: list[BenchmarkFamily], *, overwrite: bool = False
+) -> None:
+    """Register families at once, a single write to the registry"""
+    inserted = get_registry().insert_many(
+        "families",
+        [dataclasses.asdict(family) for family in families],
+        overwrite=overwrite,
     )
+    if inserted < len(families):
+        logger.error(f"{len(families) - inserted} benchmark families already exist")
+
+
+def _parse_os_release(os_release: str) -> str | None:
+    data = {
+        key.strip(): value.strip().strip('"')
+        for key, sep, value in (line.partition("=") for line in os_release.split("\n"))
+        if sep
+    }
+    if "ID" not in data or "VERSION_ID" not in data:
+        return None
+    return f"{data['ID']}:{data['VERSION_ID']}"
+
+
+def check_availability(benchmarks: Iterable[Benchmark]) -> dict[str, bool]:
+    """Resolve availability from a single image listing, without rewriting registry files"""
+    benchmarks = list(benchmarks)
+    exists = images_exist([benchmark.image for benchmark in benchmarks])
+    for benchmark in benchmarks:
+        if not exists[benchmark.image]:
+            benchmark.cleanup()
+        benchmark._availability = exists[benchmark.image]
+    return {benchmark.name: benchmark._availability for benchmark in benchmarks}
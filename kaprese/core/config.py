@@ -10,6 +10,7 @@ from kaprese.utils.logging import logger
 
 class _DOCKER_CONFIG_TYPE(TypedDict):
     DOCKER_SOCK_PATH: Optional[str]
+    DOCKER_HOSTS: Optional[str]
 
 
 def _config_path_guard[T, **P](
@@ -43,20 +44,24 @@ class _Configure(metaclass=Singleton):
     # Docker settings
     _docker_config_path = _config_path / "docker.json"
     _docker_sock_path: Optional[str] = None
+    _docker_hosts: Optional[str] = None
 
     def _read_docker_config(self) -> None:
         config = _DOCKER_CONFIG_TYPE(
             DOCKER_SOCK_PATH=None,
+            DOCKER_HOSTS=None,
         )
         if self._docker_config_path.exists():
             logger.info(f"Reading docker config: {self._docker_config_path}")
             config.update(json.loads(self._docker_config_path.read_text()))
         self._docker_sock_path = config.get("DOCKER_SOCK_PATH")
+        self._docker_hosts = config.get("DOCKER_HOSTS")
 
     @_config_path_guard
     def _write_docker_config(self) -> None:
         config = _DOCKER_CONFIG_TYPE(
             DOCKER_SOCK_PATH=self._docker_sock_path,
+            DOCKER_HOSTS=self._docker_hosts,
         )
         logger.info(f"Writing docker config: {self._docker_config_path}")
         self._docker_config_path.write_text(json.dumps(config, indent=4))
@@ -71,11 +76,22 @@ class _Configure(metaclass=Singleton):
         self._docker_sock_path = value
         self._write_docker_config()
 
+    @property
+    def DOCKER_HOSTS(self) -> Optional[str]:
+        """Docker daemons to run pairs on, as comma-separated URL=capacity"""
+        return self._docker_hosts
+
+    @DOCKER_HOSTS.setter
+    def DOCKER_HOSTS(self, value: str) -> None:
+        self._docker_hosts = value or None
+        self._write_docker_config()
+
     # reset config
     def _reload(self) -> None:
         # Docker settings
         self._docker_config_path = self._config_path / "docker.json"
         self._docker_sock_path = None
+        self._docker_hosts = None
         self._read_docker_config()
 
     def __init__(self) -> None:
@@ -84,6 +100,7 @@ class _Configure(metaclass=Singleton):
 
 SETTABLE_KEYS = [
     "DOCKER_SOCK_PATH",
+    "DOCKER_HOSTS",
 ]
 KEYS = [
     "CONFIG_PATH",
@@ -1,19 +1,13 @@
 from __future__ import annotations
 
 import dataclasses
-import json
 import uuid
-from pathlib import Path
 
 from kaprese.core.benchmark import Benchmark
-from kaprese.core.config import CONFIGURE
+from kaprese.core.registry import get_registry
 from kaprese.utils.logging import logger
 
 
-def _get_engine_path() -> Path:
-    return CONFIGURE.CONFIG_PATH / "engines"
-
-
 @dataclasses.dataclass
 class Engine:
     name: str = dataclasses.field(
@@ -33,34 +27,25 @@ class Engine:
     def dump(self) -> dict[str, str | list[str]]:
         return dataclasses.asdict(self)
 
-    def save(self, path: Path | str) -> None:
-        path = Path(path)
-        path.write_text(
-            json.dumps(
-                self.dump(),
-                indent=4,
-            )
-        )
+    def save(self) -> None:
+        if not get_registry().update("engines", self.dump()):
+            logger.error(f'Engine "{self.name}" does not exist')
 
     @classmethod
     def load(cls, name: str) -> Engine | None:
-        engine_file = _get_engine_path() / f"{name}.json"
-        if not engine_file.exists():
+        data = get_registry().get("engines", name)
+        if data is None:
             return None
-        data = json.loads(engine_file.read_text())
         return cls(**data)
 
     def register(self, *, overwrite: bool = False) -> None:
-        engines_dir = _get_engine_path()
-        if not engines_dir.exists():
-            engines_dir.mkdir(parents=True)
-        engine_file = engines_dir / f"{self.name}.json"
-        if engine_file.exists():
+        registry = get_registry()
+        if registry.exists("engines", self.name):
             logger.warning(f"Engine {self.name} already exists")
             if not overwrite:
                 return
             logger.warning(f"Overwriting engine {self.name}")
-        self.save(engine_file)
+        registry.insert("engines", self.dump(), overwrite=True)
 
     def support(self, benchmark: Benchmark) -> bool:
         return (
@@ -69,10 +54,5 @@ class Engine:
         )
 
 
-def all_engines(path: Path | None = None) -> list[Engine]:
-    path = path or _get_engine_path()
-    return [
-        engine
-        for engine_file in path.glob("*.json")
-        if (engine := Engine.load(engine_file.stem)) is not None
-    ]
+def all_engines(*, image: str | None = None) -> list[Engine]:
+    return [Engine(**data) for data in get_registry().find("engines", image=image)]
@@ -1,8 +1,49 @@
+import dataclasses
+import math
+import random
+import re
+import statistics
+from array import array
+from itertools import compress
+
+# Benchmarks are named after their problem (family), e.g., "formula-3"
+_FAMILY_PATTERN = re.compile(r"^(?P<family>.+)-\d+$")
+
+
+def benchmark_family(benchmark: str) -> str:
+    match = _FAMILY_PATTERN.match(benchmark)
+    return match.group("family") if match is not None else benchmark
+
+
+@dataclasses.dataclass
+class FamilyStats:
+    family: str
+    total: int
+    correct: int
+    accuracy: float
+    # Bootstrap confidence interval of the accuracy
+    accuracy_low: float
+    accuracy_high: float
+    # Runtime percentiles in seconds, None if no runtime was recorded
+    p50: float | None
+    p90: float | None
+    p99: float | None
+
+
 class Eval:
     def __init__(self, tool: str):
         self.tool = tool
         self.total_count = 0
         self.correct_count = 0
+        self.benchmark_counts: dict[str, dict[str, int]] = {}
+
+        # Per-benchmark results as compact columns, missing runtimes are NaN
+        self.benchmarks: list[str] = []
+        self.success = array("b")
+        self.elapsed = array("d")
+        self.family = array("I")
+        self.families: list[str] = []
+        self._family_ids: dict[str, int] = {}
 
     @property
     def increase_total_count(self):
@@ -13,6 +54,87 @@ class Eval:
         self.correct_count += 1
         self.increase_total_count
 
+    def add_counts(self, benchmark: str, counts: dict[str, int]) -> None:
+        self.benchmark_counts[benchmark] = counts
+
+    def count_totals(self) -> dict[str, int]:
+        """Sum of each per-benchmark count, e.g., reported and fixed leaks"""
+        totals: dict[str, int] = {}
+        for counts in self.benchmark_counts.values():
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def add_result(
+        self, benchmark: str, success: bool, elapsed: float | None = None
+    ) -> None:
+        family = benchmark_family(benchmark)
+        if (family_id := self._family_ids.get(family)) is None:
+            family_id = self._family_ids[family] = len(self.families)
+            self.families.append(family)
+        self.benchmarks.append(benchmark)
+        self.success.append(success)
+        self.elapsed.append(elapsed if elapsed is not None else math.nan)
+        self.family.append(family_id)
+
+    def family_stats(
+        self,
+        *,
+        confidence: float = 0.95,
+        resamples: int = 1000,
+        seed: int = 0,
+    ) -> list[FamilyStats]:
+        rng = random.Random(seed)
+        stats = [
+            self._stats(family, family_id, confidence, resamples, rng)
+            for family, family_id in self._family_ids.items()
+        ]
+        if len(stats) > 1:
+            stats.append(
+                self._stats("all", None, confidence, resamples, rng),
+            )
+        return stats
+
+    def _stats(
+        self,
+        family: str,
+        family_id: int | None,
+        confidence: float,
+        resamples: int,
+        rng: random.Random,
+    ) -> FamilyStats:
+        if family_id is None:
+            success, elapsed = self.success, self.elapsed
+        else:
+            mask = [f == family_id for f in self.family]
+            success = array("b", compress(self.success, mask))
+            elapsed = array("d", compress(self.elapsed, mask))
+        total = len(success)
+        correct = sum(success)
+        accuracy = correct / total if total > 0 else 0
+
+        # Resampling the results with replacement draws the number of successes
+        # from a binomial distribution, no need to materialize the resamples
+        if total > 0:
+            samples = sorted(
+                rng.binomialvariate(total, accuracy) / total for _ in range(resamples)
+            )
+            tail = (1 - confidence) / 2
+            low = samples[int(tail * (resamples - 1))]
+            high = samples[math.ceil((1 - tail) * (resamples - 1))]
+        else:
+            low = high = 0
+
+        runtimes = [t for t in elapsed if not math.isnan(t)]
+        p50 = p90 = p99 = None
+        if len(runtimes) == 1:
+            p50 = p90 = p99 = runtimes[0]
+        elif len(runtimes) > 1:
+            percentiles = statistics.quantiles(runtimes, n=100, method="inclusive")
+            p50, p90, p99 = percentiles[49], percentiles[89], percentiles[98]
+
+        return FamilyStats(family, total, correct, accuracy, low, high, p50, p90, p99)
+
     @property
     def get_total_count(self):
         return self.total_count
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import dataclasses
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager
+
+from kaprese.utils.docker import shares_filesystem, use_docker_host
+
+
+@dataclasses.dataclass
+class DockerHost:
+    base_url: str
+    # Number of pairs running on the host at once
+    capacity: int = 1
+    running: int = dataclasses.field(default=0, init=False)
+
+    @property
+    def remote(self) -> bool:
+        return not shares_filesystem(self.base_url)
+
+
+def parse_docker_host(spec: str) -> DockerHost:
+    """Parse URL or URL=capacity, e.g., "tcp://build-1:2375=8" """
+    base_url, sep, capacity = spec.strip().rpartition("=")
+    if not sep:
+        return DockerHost(spec.strip())
+    if not capacity.isdigit() or int(capacity) < 1:
+        raise ValueError(f"Invalid capacity of Docker host: {spec}")
+    return DockerHost(base_url, int(capacity))
+
+
+def parse_docker_hosts(specs: str) -> list[DockerHost]:
+    return [parse_docker_host(spec) for spec in specs.split(",") if spec.strip()]
+
+
+class DockerHostPool:
+    """Hand out slots of Docker hosts, the least loaded host first"""
+
+    def __init__(self, hosts: list[DockerHost]) -> None:
+        if not hosts:
+            raise ValueError("No Docker hosts in the pool")
+        self.hosts = hosts
+        self._available = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        return sum(host.capacity for host in self.hosts)
+
+    def _free_host(self) -> DockerHost | None:
+        free = [host for host in self.hosts if host.running < host.capacity]
+        if not free:
+            return None
+        return min(free, key=lambda host: host.running / host.capacity)
+
+    @contextmanager
+    def acquire(self) -> Generator[DockerHost, None, None]:
+        """Take a slot, Docker calls of the current thread go to its host"""
+        with self._available:
+            while (host := self._free_host()) is None:
+                self._available.wait()
+            host.running += 1
+        try:
+            with use_docker_host(host.base_url):
+                yield host
+        finally:
+            with self._available:
+                host.running -= 1
+                self._available.notify()
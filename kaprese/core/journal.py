@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Literal
+
+from kaprese.utils.logging import logger
+
+JOURNAL_FILE = "kaprese-journal.jsonl"
+
+type JournalPhase = Literal["check", "prepare", "run"]
+
+
+class Journal:
+    """Append-only record of the outcomes of engine/benchmark pairs
+
+    Each record is a line of JSON flushed to disk right away, so the journal
+    survives a crash or an interrupt of `kaprese run`.
+    """
+
+    def __init__(self, output_dir: Path | str) -> None:
+        self.path = Path(output_dir) / JOURNAL_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a")
+        # Terminate a torn line so that it does not swallow the next record
+        if self._file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def record(
+        self,
+        engine: str,
+        benchmark: str,
+        phase: JournalPhase,
+        ok: bool,
+        *,
+        return_code: int | None = None,
+        elapsed: float | None = None,
+    ) -> None:
+        entry: dict[str, Any] = {
+            "time": datetime.now().isoformat(),
+            "engine": engine,
+            "benchmark": benchmark,
+            "phase": phase,
+            "ok": ok,
+        }
+        if phase == "run":
+            entry["return_code"] = return_code
+            entry["elapsed"] = elapsed
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def finished(self) -> set[tuple[str, str]]:
+        """Pairs (engine, benchmark) whose latest run succeeded"""
+        self._file.flush()
+        runs = latest_runs(self.path.parent)
+        return {pair for pair, entry in runs.items() if entry["ok"]}
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> Journal:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+def read_journal(path: Path) -> Iterator[dict[str, Any]]:
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # The last line is torn if the process died while writing it
+                logger.warning(f"Skipping broken journal line {lineno}: {path}")
+
+
+def latest_runs(output_dir: Path | str) -> dict[tuple[str, str], dict[str, Any]]:
+    """Latest run record of each pair (engine, benchmark) in the output directory"""
+    path = Path(output_dir) / JOURNAL_FILE
+    if not path.exists():
+        return {}
+    return {
+        (entry["engine"], entry["benchmark"]): entry
+        for entry in read_journal(path)
+        if entry.get("phase") == "run"
+    }
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import dataclasses
+from collections import defaultdict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+from kaprese.core.benchmark import Benchmark
+from kaprese.core.engine import Engine
+from kaprese.utils.logging import logger
+from kaprese.utils.tracing import span
+
+# Benchmarks probed at once while planning
+PLAN_JOBS = 16
+
+type CompatibilityIndex = dict[tuple[str, str], set[str]]
+
+
+@dataclasses.dataclass
+class Plan:
+    # Pairs to run, in the order of the engine/benchmark product
+    pairs: list[tuple[Engine, Benchmark]] = dataclasses.field(default_factory=list)
+    unsupported: list[tuple[Engine, Benchmark]] = dataclasses.field(
+        default_factory=list
+    )
+    # Benchmarks to pull before their support is known, their pairs are in `pairs`
+    unresolved: list[Benchmark] = dataclasses.field(default_factory=list)
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        """Number of runnable, unsupported and unresolved pairs per engine"""
+        unresolved = {benchmark.name for benchmark in self.unresolved}
+        counts: defaultdict[str, dict[str, int]] = defaultdict(
+            lambda: {"runnable": 0, "unsupported": 0, "unresolved": 0}
+        )
+        for engine, benchmark in self.pairs:
+            key = "unresolved" if benchmark.name in unresolved else "runnable"
+            counts[engine.name][key] += 1
+        for engine, _ in self.unsupported:
+            counts[engine.name]["unsupported"] += 1
+        return dict(counts)
+
+
+def compatibility_index(engines: Iterable[Engine]) -> CompatibilityIndex:
+    """Map each (os, language) to the names of the engines supporting it"""
+    index: defaultdict[tuple[str, str], set[str]] = defaultdict(set)
+    for engine in engines:
+        for os in engine.supported_os:
+            for language in engine.supported_languages:
+                index[(os, language)].add(engine.name)
+    return dict(index)
+
+
+def _resolve(benchmark: Benchmark) -> None:
+    with span("resolve", benchmark=benchmark.name):
+        # Reading language and os probes the image once, if not known yet
+        known = (benchmark._language, benchmark._os, benchmark._workdir)
+        benchmark.language
+        benchmark.os
+        benchmark.workdir
+        if (benchmark._language, benchmark._os, benchmark._workdir) != known:
+            benchmark.save()
+
+
+def resolve_metadata(benchmarks: Iterable[Benchmark], *, jobs: int = PLAN_JOBS) -> None:
+    """Resolve language, os and workdir of available benchmarks in parallel
+
+    Availability must be known already (see check_availability).
+    """
+    available = [benchmark for benchmark in benchmarks if benchmark._availability]
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [executor.submit(_resolve, benchmark) for benchmark in available]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def plan(
+    engines: list[Engine],
+    benchmarks: list[Benchmark],
+    *,
+    jobs: int = PLAN_JOBS,
+) -> Plan:
+    """Split the engine/benchmark product into supported and unsupported pairs
+
+    Benchmarks not available yet are kept for every engine, their support is
+    checked once they are pulled.
+    """
+    resolve_metadata(benchmarks, jobs=jobs)
+    index = compatibility_index(engines)
+
+    supported: dict[str, set[str] | None] = {}
+    result = Plan()
+    for benchmark in benchmarks:
+        if not benchmark._availability:
+            supported[benchmark.name] = None
+            result.unresolved.append(benchmark)
+            continue
+        os, language = benchmark.os, benchmark.language
+        supported[benchmark.name] = (
+            index.get((os, language), set())
+            if os is not None and language is not None
+            else set()
+        )
+
+    for engine in engines:
+        for benchmark in benchmarks:
+            engines_supporting = supported[benchmark.name]
+            if engines_supporting is None or engine.name in engines_supporting:
+                result.pairs.append((engine, benchmark))
+            else:
+                result.unsupported.append((engine, benchmark))
+    logger.info(
+        "Planned %d pairs, %d unsupported, %d benchmarks to pull",
+        len(result.pairs),
+        len(result.unsupported),
+        len(result.unresolved),
+    )
+    return result
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Literal
+
+from kaprese.core.config import CONFIGURE
+from kaprese.utils.logging import logger
+
+type RegistryKind = Literal["benchmarks", "engines", "families"]
+
+# Indexed columns of each kind, mapped to the keys of the stored entries
+_COLUMNS: dict[RegistryKind, dict[str, str]] = {
+    "benchmarks": {"image": "image", "language": "_language", "os": "_os"},
+    "engines": {"image": "image"},
+    "families": {},
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchmarks (
+    name TEXT PRIMARY KEY,
+    image TEXT NOT NULL,
+    language TEXT,
+    os TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS benchmarks_image ON benchmarks (image);
+CREATE INDEX IF NOT EXISTS benchmarks_language ON benchmarks (language);
+CREATE INDEX IF NOT EXISTS benchmarks_os ON benchmarks (os);
+
+CREATE TABLE IF NOT EXISTS engines (
+    name TEXT PRIMARY KEY,
+    image TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS engines_image ON engines (image);
+
+CREATE TABLE IF NOT EXISTS families (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _read_legacy(legacy_dir: Path) -> list[dict[str, Any]]:
+    entries: list[dict[str, Any]] = []
+    for entry_file in legacy_dir.glob("*.json"):
+        try:
+            entries.append(json.loads(entry_file.read_text()))
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping broken registry file: {entry_file}")
+        except FileNotFoundError:
+            # Renamed away by a process that already imported it
+            pass
+    return entries
+
+
+class Registry:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        for kind in _COLUMNS:
+            self._migrate(kind, path.parent / kind)
+
+    def _migrate(self, kind: RegistryKind, legacy_dir: Path) -> None:
+        """Import the legacy layout (one JSON file per entry) into the registry"""
+        if not legacy_dir.is_dir():
+            return
+        with self._lock:
+            # Processes starting at once migrate one after another, the later
+            # ones find the directory gone once they hold the write lock
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                migrated = legacy_dir.is_dir()
+                if migrated:
+                    logger.info(f"Migrating {kind} from {legacy_dir} to {self.path}")
+                    # Entries already in the registry win over the legacy files
+                    self._conn.executemany(
+                        self._insert_query(kind, overwrite=False),
+                        [self._row(kind, data) for data in _read_legacy(legacy_dir)],
+                    )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        if not migrated:
+            return
+        try:
+            legacy_dir.rename(legacy_dir.with_name(f"{kind}.migrated"))
+        except FileNotFoundError:
+            # Renamed by a process importing the same entries again, ignored
+            pass
+
+    def _row(self, kind: RegistryKind, data: dict[str, Any]) -> list[Any]:
+        return [
+            data["name"],
+            *(data.get(key) for key in _COLUMNS[kind].values()),
+            json.dumps(data),
+        ]
+
+    def _insert_query(self, kind: RegistryKind, *, overwrite: bool) -> str:
+        columns = ["name", *_COLUMNS[kind], "data"]
+        return (
+            f"INSERT OR {'REPLACE' if overwrite else 'IGNORE'} INTO {kind} "
+            f"({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        )
+
+    def _insert_many(
+        self,
+        kind: RegistryKind,
+        entries: list[dict[str, Any]],
+        *,
+        overwrite: bool,
+    ) -> int:
+        query = self._insert_query(kind, overwrite=overwrite)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cursor = self._conn.executemany(
+                    query, [self._row(kind, data) for data in entries]
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return cursor.rowcount
+
+    def insert(
+        self,
+        kind: RegistryKind,
+        data: dict[str, Any],
+        *,
+        overwrite: bool = False,
+    ) -> bool:
+        return self._insert_many(kind, [data], overwrite=overwrite) > 0
+
+    def insert_many(
+        self,
+        kind: RegistryKind,
+        entries: list[dict[str, Any]],
+        *,
+        overwrite: bool = False,
+    ) -> int:
+        """Insert entries in a single transaction, returns the number inserted"""
+        return self._insert_many(kind, entries, overwrite=overwrite)
+
+    def update(self, kind: RegistryKind, data: dict[str, Any]) -> bool:
+        columns = [*_COLUMNS[kind], "data"]
+        name, *values = self._row(kind, data)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE {kind} SET {', '.join(f'{c} = ?' for c in columns)} WHERE name = ?",
+                [*values, name],
+            )
+            return cursor.rowcount > 0
+
+    def delete(self, kind: RegistryKind, name: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM {kind} WHERE name = ?", [name])
+            return cursor.rowcount > 0
+
+    def exists(self, kind: RegistryKind, name: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT 1 FROM {kind} WHERE name = ?", [name])
+            return cursor.fetchone() is not None
+
+    def get(self, kind: RegistryKind, name: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT data FROM {kind} WHERE name = ?", [name]
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def find(self, kind: RegistryKind, **filters: str | None) -> list[dict[str, Any]]:
+        """Find entries by indexed columns, filters set to None are ignored"""
+        conditions = {k: v for k, v in filters.items() if v is not None}
+        for column in conditions:
+            if column not in _COLUMNS[kind]:
+                raise ValueError(f"Unknown {kind} column: {column}")
+        query = f"SELECT data FROM {kind}"
+        if conditions:
+            query += " WHERE " + " AND ".join(f"{c} = ?" for c in conditions)
+        query += " ORDER BY name"
+        with self._lock:
+            rows = self._conn.execute(query, list(conditions.values())).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_registries: dict[Path, Registry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    path = CONFIGURE.CONFIG_PATH / "registry.db"
+    with _registries_lock:
+        if (registry := _registries.get(path)) is None:
+            registry = _registries[path] = Registry(path)
+        return registry
@@ -1,17 +1,73 @@
+import asyncio
 import datetime
+import functools
+import hashlib
+import json
 import os
+import posixpath
+import subprocess
+from collections.abc import Generator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
 from pathlib import Path
+from typing import Any, Literal
 
 from kaprese.core.benchmark import Benchmark
 from kaprese.core.engine import Engine
+from kaprese.core.store import detach
+from kaprese.utils import aiodocker, local
+from kaprese.utils.capture import OutputCapture
 from kaprese.utils.docker import (
+    DockerStreamResult,
     build_image,
     delete_image,
-    image_exists,
+    image_labels,
+    inspect_image,
     pull_image,
     run_commands_stream,
 )
 from kaprese.utils.logging import enable_filelogging, logger
+from kaprese.utils.resources import ResourceSampler, ResourceUsage
+from kaprese.utils.tracing import span
+
+# Label of runner images holding the hash of the inputs they were built from
+RUNNER_INPUTS_LABEL = "io.github.kupl.kaprese.inputs"
+# Prefix of inputs hashes whose engine location could not be resolved
+UNRESOLVED_INPUTS_PREFIX = "unresolved-"
+
+
+@functools.cache
+def _location_revision(location: str) -> str | None:
+    """Resolve a build context location to something that changes with its content"""
+    path = Path(location).expanduser()
+    if path.is_dir():
+        digest = hashlib.sha256()
+        for file in sorted(p for p in path.rglob("*") if p.is_file()):
+            digest.update(str(file.relative_to(path)).encode())
+            with open(file, "rb") as f:
+                digest.update(hashlib.file_digest(f, "sha256").digest())
+        return digest.hexdigest()
+
+    # Remote git context, e.g., https://github.com/kupl/kaprese-engines.git#main:context
+    repository, _, fragment = location.partition("#")
+    ref = fragment.partition(":")[0] or "HEAD"
+    try:
+        out = subprocess.run(
+            ["git", "ls-remote", repository, ref],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(
+            'Failed to resolve revision of "%s", runner images built from it '
+            "will be rebuilt: %s",
+            location,
+            e,
+        )
+        return None
+    revision = out.split()[0] if out else ref
+    return f"{location}@{revision}"
 
 
 class Runner:
@@ -21,29 +77,45 @@ class Runner:
         engine: Engine,
         output_dir: str | None = None,
         extra_args: str | list[str] = "",
+        *,
+        compress_output: bool = False,
+        output_max_bytes: int | None = None,
+        output_sample_interval: float = 1.0,
+        sample_resources: bool = False,
     ):
         self.benchmark = benchmark
         self.engine = engine
         self.extra_args = (
             extra_args if isinstance(extra_args, str) else " ".join(extra_args)
         )
+        self.compress_output = compress_output
+        self.output_max_bytes = output_max_bytes
+        self.output_sample_interval = output_sample_interval
+        self.sample_resources = sample_resources
 
         self.output_dir = Path(
             f"{output_dir or 'kaprese-out'}/{engine.name}/{benchmark.name}"
         )
         self.uid = os.getuid()
         self.gid = os.getgid()
-        self.mount_dir = Path(self.benchmark.workdir or "/") / "kaprese-out"
 
         if self.output_dir.exists():
             logger.warning(
                 'Output directory "%s" already exists, the results may be overwritten',
                 self.output_dir,
             )
+            # Files shared with the output store must not be overwritten in place
+            detach(self.output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
         self._start_time = None
         self._end_time = None
+        self.return_code: int | None = None
+        self.resources: ResourceUsage | None = None
+
+    @functools.cached_property
+    def mount_dir(self) -> Path:
+        return Path(self.benchmark.workdir or "/") / "kaprese-out"
 
     @property
     def elapsed_time(self) -> datetime.timedelta | None:
@@ -55,6 +127,41 @@ class Runner:
     def _logfile(self) -> Path:
         return self.output_dir / "kaprese.log"
 
+    @property
+    def _output_logfile(self) -> Path:
+        return self.output_dir / "output.log"
+
+    def _capture_output(self) -> OutputCapture:
+        return OutputCapture(
+            self._output_logfile,
+            compress=self.compress_output,
+            max_bytes=self.output_max_bytes,
+            sample=self._log_output,
+            sample_interval=self.output_sample_interval,
+        )
+
+    @property
+    def _resources_file(self) -> Path:
+        return self.output_dir / "resources.csv"
+
+    def _sample(
+        self, container_id: str | None
+    ) -> AbstractContextManager[ResourceSampler | None]:
+        if not self.sample_resources or container_id is None:
+            return nullcontext()
+        return ResourceSampler(container_id, self._resources_file)
+
+    def _log_resources(self, sampler: ResourceSampler | None) -> None:
+        if sampler is None:
+            return
+        self.resources = sampler.usage
+        logger.info(
+            'Used %.1f CPU seconds and %d bytes of memory at peak (see "%s")',
+            self.resources.cpu_seconds,
+            self.resources.memory_peak,
+            sampler.path,
+        )
+
     @property
     def _runner_image_tag(self) -> str:
         return f"{self.engine.image}:{self.benchmark.name}"
@@ -67,37 +174,30 @@ class Runner:
                 self.benchmark.name,
             )
             runner_image_tag = self._runner_image_tag
-            if force or not image_exists(runner_image_tag):
-                logger.info(
-                    'Trying to pull or build engine image "%s"', self.engine.image
-                )
-                if pull_image(runner_image_tag):
-                    logger.info('Pulled runner image "%s"', runner_image_tag)
-
-                else:
-                    logger.info('No prebuilt runner image "%s"', runner_image_tag)
-                    if self.engine.location is None:
-                        logger.error(
-                            'Failed to pull runner image "%s": no engine location provided',
-                            runner_image_tag,
-                        )
-                        return False
-
-                    build_args = self._process_build_args(self.engine.build_args)
-                    if build_image(
-                        runner_image_tag,
-                        self.engine.location,
-                        build_args,
-                        nocache=force,
-                    ):
-                        logger.info('Built runner image "%s"', runner_image_tag)
-                    else:
-                        logger.warning(
-                            'Failed to build runner image "%s": maybe wrong location? (current=%s)',
-                            runner_image_tag,
-                            self.engine.location,
-                        )
-                        return False
+            build_args = self._process_build_args(self.engine.build_args)
+            inputs_hash = self._inputs_hash(
+                build_args, inspect_image(self.benchmark.image)
+            )
+            action = self._prepare_action(
+                image_labels(runner_image_tag), inputs_hash, force=force
+            )
+
+            if action == "pull" and pull_image(runner_image_tag):
+                logger.info('Pulled runner image "%s"', runner_image_tag)
+
+            elif action != "keep":
+                if not self._check_location():
+                    return False
+                if not build_image(
+                    runner_image_tag,
+                    self.engine.location,  # type: ignore
+                    build_args,
+                    nocache=force,
+                    labels={RUNNER_INPUTS_LABEL: inputs_hash},
+                ):
+                    self._log_build_failure()
+                    return False
+                logger.info('Built runner image "%s"', runner_image_tag)
 
             logger.info(
                 "Prepared runner(%s, %s)",
@@ -108,68 +208,334 @@ class Runner:
 
     def run(self, *, delete_runner: bool = False) -> bool:
         with enable_filelogging(self._logfile, mode="a"):
-            self._start_time = datetime.datetime.now()
+            self._log_start()
+
+            with (
+                self._run_stream() as result,
+                self._capture_output() as capture,
+                self._sample(result.container_id) as sampler,
+            ):
+                if result.stream is not None:
+                    with span("execute"):
+                        for chunk in result.stream:
+                            capture.write(chunk)
+
+            if delete_runner:
+                self._delete_runner()
+
+            self.return_code = result.return_code
+            self._log_finish()
+            logger.info(
+                'Captured %d bytes of output in "%s"',
+                capture.total_bytes,
+                capture.path,
+            )
+            self._log_resources(sampler)
+            return self.return_code == 0
+
+    def _run_stream(
+        self,
+    ) -> AbstractContextManager[DockerStreamResult | local.LocalStreamResult]:
+        return run_commands_stream(
+            self._runner_image_tag,
+            self._commands,
+            workdir=self.benchmark.workdir,
+            mount={self.output_dir: self.mount_dir},
+        )
+
+    def _delete_runner(self) -> None:
+        logger.info('Deleting runner image "%s"', self._runner_image_tag)
+        delete_image(self._runner_image_tag)
+
+    def _prepare_action(
+        self,
+        labels: dict[str, str] | None,
+        inputs_hash: str,
+        *,
+        force: bool,
+    ) -> Literal["keep", "pull", "build"]:
+        runner_image_tag = self._runner_image_tag
+        if force:
+            logger.info('Rebuilding runner image "%s"', runner_image_tag)
+            return "build"
+        built_from = labels.get(RUNNER_INPUTS_LABEL) if labels is not None else None
+        # Images built from an unresolved location are never known to be up to date
+        if built_from == inputs_hash and not inputs_hash.startswith(
+            UNRESOLVED_INPUTS_PREFIX
+        ):
+            logger.info(
+                'Runner image "%s" is up to date, skip building', runner_image_tag
+            )
+            return "keep"
+        if labels is not None and built_from is None:
+            logger.info('Using prebuilt runner image "%s"', runner_image_tag)
+            return "keep"
+        if labels is not None:
+            logger.info('Runner image "%s" is stale', runner_image_tag)
+        logger.info('Trying to pull or build engine image "%s"', self.engine.image)
+        return "pull" if labels is None else "build"
+
+    def _check_location(self) -> bool:
+        logger.info('No prebuilt runner image "%s"', self._runner_image_tag)
+        if self.engine.location is None:
+            logger.error(
+                'Failed to pull runner image "%s": no engine location provided',
+                self._runner_image_tag,
+            )
+            return False
+        return True
+
+    def _log_build_failure(self) -> None:
+        logger.warning(
+            'Failed to build runner image "%s": maybe wrong location? (current=%s)',
+            self._runner_image_tag,
+            self.engine.location,
+        )
+
+    def _log_start(self) -> None:
+        self._start_time = datetime.datetime.now()
+        logger.info(
+            "Starting runner(%s, %s) at %s",
+            self.engine.name,
+            self.benchmark.name,
+            self._start_time,
+        )
+        logger.info(
+            'Running benchmark "%s" with engine "%s"',
+            self.benchmark.name,
+            self.engine.name,
+        )
+
+    def _log_output(self, line: str) -> None:
+        logger.info("Runner(%s, %s) %s", self.engine.name, self.benchmark.name, line)
+
+    def _log_finish(self) -> None:
+        self._end_time = datetime.datetime.now()
+        logger.info(
+            "Finished runner(%s, %s) at %s (elapsed time: %s)",
+            self.engine.name,
+            self.benchmark.name,
+            self._end_time,
+            self.elapsed_time,
+        )
+
+    @property
+    def _commands(self) -> list[str] | None:
+        commands = (
+            [self.engine.exec_commands]
+            if isinstance(self.engine.exec_commands, str)
+            else self.engine.exec_commands
+        )
+        if isinstance(commands, list):
+            commands = [self._process_command(c) for c in commands]
+        return commands
+
+    def _inputs_hash(
+        self,
+        build_args: dict[str, str],
+        benchmark_image: dict[str, Any] | None,
+    ) -> str:
+        revision = (
+            _location_revision(self.engine.location)
+            if self.engine.location is not None
+            else None
+        )
+        inputs = {
+            "location": revision or self.engine.location,
+            "build_args": build_args,
+            "benchmark_image": (
+                benchmark_image["Id"]
+                if benchmark_image is not None
+                else self.benchmark.image
+            ),
+        }
+        digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+        if self.engine.location is not None and revision is None:
+            return UNRESOLVED_INPUTS_PREFIX + digest
+        return digest
+
+    def _format(self, s: str) -> str:
+        return s.format(
+            benchmark=self.benchmark,
+            engine=self.engine,
+            runner=self,
+        )
+
+    def _process_build_args(self, build_args: dict[str, str]) -> dict[str, str]:
+        return {k: self._format(v) for k, v in build_args.items()}
+
+    def _process_command(self, command: str) -> str:
+        return self._format(command)
+
+
+class AsyncRunner(Runner):
+    """Runner driving the Docker Engine API from asyncio, one task per runner"""
+
+    async def prepare(self, *, force: bool = False) -> bool:  # type: ignore[override]
+        with enable_filelogging(self._logfile, mode="w"):
             logger.info(
-                "Starting runner(%s, %s) at %s",
+                "Preparing runner(%s, %s)",
                 self.engine.name,
                 self.benchmark.name,
-                self._start_time,
             )
+            runner_image_tag = self._runner_image_tag
+            build_args = self._process_build_args(self.engine.build_args)
+            inputs_hash = await asyncio.to_thread(
+                self._inputs_hash,
+                build_args,
+                await aiodocker.inspect_image(self.benchmark.image),
+            )
+            runner_image = await aiodocker.inspect_image(runner_image_tag)
+            labels = (
+                ((runner_image.get("Config") or {}).get("Labels") or {})
+                if runner_image is not None
+                else None
+            )
+            action = self._prepare_action(labels, inputs_hash, force=force)
 
-            runner_image_tag = f"{self.engine.image}:{self.benchmark.name}"
+            if action == "pull" and await aiodocker.pull_image(runner_image_tag):
+                logger.info('Pulled runner image "%s"', runner_image_tag)
+
+            elif action != "keep":
+                if not self._check_location():
+                    return False
+                if not await aiodocker.build_image(
+                    runner_image_tag,
+                    self.engine.location,  # type: ignore
+                    build_args,
+                    nocache=force,
+                    labels={RUNNER_INPUTS_LABEL: inputs_hash},
+                ):
+                    self._log_build_failure()
+                    return False
+                logger.info('Built runner image "%s"', runner_image_tag)
 
             logger.info(
-                'Running benchmark "%s" with engine "%s"',
-                self.benchmark.name,
+                "Prepared runner(%s, %s)",
                 self.engine.name,
+                self.benchmark.name,
             )
+            return True
 
-            commands = (
-                [self.engine.exec_commands]
-                if isinstance(self.engine.exec_commands, str)
-                else self.engine.exec_commands
-            )
-            if isinstance(commands, list):
-                commands = [self._process_command(c) for c in commands]
+    async def run(self, *, delete_runner: bool = False) -> bool:  # type: ignore[override]
+        with enable_filelogging(self._logfile, mode="a"):
+            self._log_start()
+            runner_image_tag = self._runner_image_tag
 
-            with run_commands_stream(
+            async with aiodocker.run_commands_stream(
                 runner_image_tag,
-                commands,
+                self._commands,
                 workdir=self.benchmark.workdir,
                 mount={self.output_dir: self.mount_dir},
             ) as result:
-                if result.stream is not None:
-                    for line in result.stream:
-                        logger.debug(
-                            "Runner(%s, %s) %s",
-                            self.engine.name,
-                            self.benchmark.name,
-                            line.decode().strip("\n"),
-                        )
+                # Resources are still sampled by a docker-py thread per container
+                with (
+                    self._capture_output() as capture,
+                    self._sample(result.container_id) as sampler,
+                ):
+                    if result.stream is not None:
+                        with span("execute"):
+                            async for chunk in result.stream:
+                                capture.write(chunk)
 
             if delete_runner:
                 logger.info('Deleting runner image "%s"', runner_image_tag)
-                delete_image(runner_image_tag)
+                try:
+                    await aiodocker.delete_image(runner_image_tag)
+                except aiodocker.AsyncDockerError as e:
+                    logger.warning(
+                        'Failed to delete runner image "%s": %s', runner_image_tag, e
+                    )
 
-            self._end_time = datetime.datetime.now()
+            self.return_code = result.return_code
+            self._log_finish()
             logger.info(
-                "Finished runner(%s, %s) at %s (elapsed time: %s)",
+                'Captured %d bytes of output in "%s"',
+                capture.total_bytes,
+                capture.path,
+            )
+            self._log_resources(sampler)
+            return self.return_code == 0
+
+
+def _local_metadata(sources: Path, metadata_file: str | None) -> dict[str, Any]:
+    if metadata_file is None or not (sources / metadata_file).is_file():
+        return {}
+    try:
+        return json.loads((sources / metadata_file).read_text())
+    except json.JSONDecodeError:
+        logger.debug('Broken metadata file "%s"', sources / metadata_file)
+        return {}
+
+
+class LocalRunner(Runner):
+    """Runner running engines installed on the host as local processes
+
+    Each run works in a temporary copy of the benchmark sources, extracted
+    beforehand to `<sources>/<benchmark name>`, so no image is built or run.
+    """
+
+    def __init__(
+        self,
+        benchmark: Benchmark,
+        engine: Engine,
+        output_dir: str | None = None,
+        extra_args: str | list[str] = "",
+        *,
+        sources: Path | str,
+        **kwargs: Any,
+    ):
+        self.sources = Path(sources).expanduser() / benchmark.name
+        super().__init__(benchmark, engine, output_dir, extra_args, **kwargs)
+
+    @classmethod
+    def supports(
+        cls, engine: Engine, benchmark: Benchmark, sources: Path | str
+    ) -> bool:
+        """Check the language only, the host is the OS of every local run"""
+        language = benchmark._language or _local_metadata(
+            Path(sources).expanduser() / benchmark.name, benchmark.metadata_file
+        ).get("language")
+        return language in engine.supported_languages
+
+    @property
+    def mount_dir(self) -> Path:  # type: ignore[override]
+        # Commands write to the output directory directly
+        return self.output_dir.resolve()
+
+    def prepare(self, *, force: bool = False) -> bool:
+        with enable_filelogging(self._logfile, mode="w"):
+            logger.info(
+                "Preparing local runner(%s, %s)",
                 self.engine.name,
                 self.benchmark.name,
-                self._end_time,
-                self.elapsed_time,
             )
-            return code == 0 if (code := result.return_code) is not None else False
+            if not self.sources.is_dir():
+                logger.error(
+                    'Sources of benchmark "%s" not found in "%s"',
+                    self.benchmark.name,
+                    self.sources,
+                )
+                return False
+            return True
 
-    def _format(self, s: str) -> str:
-        return s.format(
-            benchmark=self.benchmark,
-            engine=self.engine,
-            runner=self,
+    @contextmanager
+    def _run_stream(self) -> Generator[local.LocalStreamResult, None, None]:
+        buggy_path = _local_metadata(self.sources, self.benchmark.metadata_file).get(
+            "buggyPath", "."
         )
+        # The sources are a copy of the image workdir, buggyPath is resolved
+        # against it as in the image, paths leaving it cannot be run locally
+        relative = posixpath.normpath(buggy_path)
+        if posixpath.isabs(relative) or relative.split("/")[0] == "..":
+            logger.error('buggyPath "%s" is outside the benchmark sources', buggy_path)
+            yield local.LocalStreamResult()
+            return
+        with local.sandbox(self.sources) as sandbox:
+            workdir = sandbox / relative
+            logger.info('Running in sandbox "%s"', workdir)
+            with local.run_commands_stream(self._commands, workdir) as result:
+                yield result
 
-    def _process_build_args(self, build_args: dict[str, str]) -> dict[str, str]:
-        return {k: self._format(v) for k, v in build_args.items()}
-
-    def _process_command(self, command: str) -> str:
-        return self._format(command)
+    def _delete_runner(self) -> None:
+        logger.debug("No runner image to delete for local runs")
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import dataclasses
+import errno
+import hashlib
+import os
+import shutil
+import stat
+from collections.abc import Iterator
+from pathlib import Path
+
+from kaprese.utils.logging import logger
+
+STORE_DIR = ".kaprese-store"
+
+# Smaller files are not worth hashing
+DEFAULT_MIN_SIZE = 1024
+_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclasses.dataclass
+class StoreStats:
+    files: int = 0
+    # Files replaced by a link to an existing blob
+    deduplicated: int = 0
+    bytes_saved: int = 0
+
+    def __iadd__(self, other: StoreStats) -> StoreStats:
+        self.files += other.files
+        self.deduplicated += other.deduplicated
+        self.bytes_saved += other.bytes_saved
+        return self
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _regular_files(directory: Path) -> Iterator[tuple[Path, os.stat_result]]:
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = Path(root) / name
+            st = path.lstat()
+            if stat.S_ISREG(st.st_mode):
+                yield path, st
+
+
+def detach(directory: Path | str) -> int:
+    """Give linked files in a directory their own copy, so they can be overwritten
+
+    Engines overwrite the files of a previous run in place, which would change
+    the blob in the store and every other run linked to it.
+    """
+    detached = 0
+    for path, st in _regular_files(Path(directory)):
+        if st.st_nlink < 2:
+            continue
+        tmp = path.with_name(f".{path.name}.kaprese-detach")
+        shutil.copy2(path, tmp)
+        tmp.replace(path)
+        detached += 1
+    if detached:
+        logger.info(f"Detached {detached} files of {directory} from the output store")
+    return detached
+
+
+class OutputStore:
+    """Content-addressed blobs of output files, shared by hardlinks
+
+    Blobs live in `<output>/.kaprese-store/objects/<hash[:2]>/<hash[2:]>`, so
+    they are on the same filesystem as the outputs. A blob is referenced as
+    long as another link to it exists, i.e., its link count is more than one.
+    Linked files share the permissions and times of the first stored copy.
+    """
+
+    def __init__(
+        self, output_dir: Path | str, *, min_size: int = DEFAULT_MIN_SIZE
+    ) -> None:
+        self.root = Path(output_dir) / STORE_DIR
+        self.objects = self.root / "objects"
+        self.min_size = min_size
+
+    def _blob(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest[2:]
+
+    def add_file(self, path: Path, st: os.stat_result) -> StoreStats:
+        stats = StoreStats()
+        # Already in the store, or linked on purpose
+        if st.st_size < self.min_size or st.st_nlink > 1:
+            return stats
+        blob = self._blob(_hash_file(path))
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        stats.files += 1
+        try:
+            os.link(path, blob)
+            return stats
+        except FileExistsError:
+            pass
+        except OSError as e:
+            logger.debug(f"Failed to store {path}: {e}")
+            return stats
+
+        tmp = path.with_name(f".{path.name}.kaprese-link")
+        try:
+            os.link(blob, tmp)
+        except OSError as e:
+            # Too many links to the blob, keep the file as it is
+            if e.errno != errno.EMLINK:
+                logger.debug(f"Failed to link {path} to {blob}: {e}")
+            return stats
+        tmp.replace(path)
+        stats.deduplicated += 1
+        stats.bytes_saved += st.st_size
+        return stats
+
+    def add(self, directory: Path | str) -> StoreStats:
+        """Replace the files of a directory by links to the blobs of their content
+
+        Only add directories of finished runs, files changed in place afterwards
+        would change the blob (see `detach`).
+        """
+        stats = StoreStats()
+        directory = Path(directory)
+        for path, st in _regular_files(directory):
+            stats += self.add_file(path, st)
+        logger.info(
+            f"Stored {stats.files} files of {directory}, "
+            f"{stats.deduplicated} deduplicated ({stats.bytes_saved} bytes saved)"
+        )
+        return stats
+
+    def gc(self, *, dry_run: bool = False) -> tuple[int, int]:
+        """Delete blobs no output links to, returns the number of blobs and bytes"""
+        blobs = freed = 0
+        if not self.objects.is_dir():
+            return blobs, freed
+        for blob, st in _regular_files(self.objects):
+            if st.st_nlink > 1:
+                continue
+            blobs += 1
+            freed += st.st_size
+            if not dry_run:
+                blob.unlink()
+        for fanout in self.objects.iterdir():
+            if not dry_run and fanout.is_dir() and not any(fanout.iterdir()):
+                fanout.rmdir()
+        logger.info(f"Collected {blobs} unreferenced blobs ({freed} bytes)")
+        return blobs, freed
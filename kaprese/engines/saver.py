@@ -1,5 +1,9 @@
 from kaprese.core.engine import Engine
 
+# The output directory gets the whole infer-out directory of saver (see the
+# exec commands below), patches are counted wherever saver wrote them in it
+PATCH_GLOB = "**/*.patch"
+
 
 def register_saver(overwrite: bool = False) -> None:
     saver = Engine(
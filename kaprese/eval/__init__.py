@@ -1,6 +1,7 @@
 from kaprese.eval.cafe import eval_cafe
+from kaprese.eval.saver import eval_saver
 
 ENGINES = {
-    # "saver": register_saver,
+    "saver": eval_saver,
     "cafe": eval_cafe,
 }
@@ -1,20 +1,25 @@
 from pathlib import Path
 
 from kaprese.core.eval import Eval
+from kaprese.core.journal import latest_runs
+from kaprese.eval.scan import scan_outputs
 
 
-def eval_cafe(output_directory) -> Eval:
-    eval = Eval("cafe")
+def _has_fix(benchmark_dir: Path) -> bool:
+    return next(benchmark_dir.rglob("fixed.ml"), None) is not None
 
-    tool_dir = Path.cwd() / output_directory / "cafe"
 
-    for benchmark_dir in tool_dir.iterdir():
-        if benchmark_dir.is_dir():
-            found_files = list(benchmark_dir.rglob("fixed.ml"))
+def eval_cafe(output_directory) -> Eval:
+    eval = Eval("cafe")
 
-            if len(found_files) == 0:
-                eval.increase_total_count
-            else:
-                eval.increase_correct_count
+    runs = latest_runs(output_directory)
+    for benchmark, fixed in scan_outputs(output_directory, "cafe", _has_fix).items():
+        if not fixed:
+            eval.increase_total_count
+        else:
+            eval.increase_correct_count
+        eval.add_result(
+            benchmark, fixed, runs.get(("cafe", benchmark), {}).get("elapsed")
+        )
 
     return eval
@@ -0,0 +1,89 @@
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from kaprese.core.eval import Eval
+from kaprese.core.journal import latest_runs
+from kaprese.engines.saver import PATCH_GLOB
+from kaprese.eval.scan import scan_outputs
+from kaprese.utils.logging import logger
+
+# Bug types of infer reporting resource leaks
+LEAK_BUG_TYPES = frozenset({"MEMORY_LEAK", "RESOURCE_LEAK", "MEMORY_LEAK_C"})
+_CHUNK_SIZE = 1 << 16
+_SEPARATORS = " \t\r\n,"
+
+
+def iter_json_array(path: Path) -> Iterator[Any]:
+    """Iterate over the elements of a JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace and separators, then decode the next element
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != "[":
+                    raise ValueError(f"Not a JSON array: {path}")
+                started = True
+                pos += 1
+                continue
+            if started and pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number may continue in the next chunk, e.g., "-0" of "-0.5",
+                # so a value is complete only once a separator follows it
+                if end == len(buffer) or buffer[end] not in _SEPARATORS + "]":
+                    raise json.JSONDecodeError("Truncated value", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(_CHUNK_SIZE)
+                eof = chunk == ""
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield value
+            pos = end
+
+
+def _count_leaks(benchmark_dir: Path) -> dict[str, int]:
+    report = benchmark_dir / "report.json"
+    reported = 0
+    if report.exists():
+        try:
+            for issue in iter_json_array(report):
+                if issue.get("bug_type") in LEAK_BUG_TYPES:
+                    reported += 1
+        except ValueError as e:
+            logger.warning(f"Broken report {report}: {e}")
+    fixed = sum(1 for _ in benchmark_dir.glob(PATCH_GLOB))
+    return {"reported": reported, "fixed": fixed}
+
+
+def eval_saver(output_directory) -> Eval:
+    eval = Eval("saver")
+    runs = latest_runs(output_directory)
+
+    # Cached counts are only reused for the same patch layout
+    for benchmark, counts in scan_outputs(
+        output_directory, "saver", _count_leaks, key=f"saver:{PATCH_GLOB}"
+    ).items():
+        eval.add_counts(benchmark, counts)
+        # A benchmark is fixed once every reported leak is fixed
+        fixed = 0 < counts["reported"] <= counts["fixed"]
+        if not fixed:
+            eval.increase_total_count
+        else:
+            eval.increase_correct_count
+        eval.add_result(
+            benchmark, fixed, runs.get(("saver", benchmark), {}).get("elapsed")
+        )
+
+    return eval
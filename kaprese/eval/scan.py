@@ -0,0 +1,92 @@
+import json
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from kaprese.utils.logging import logger
+
+INDEX_FILE = ".kaprese-eval-index.json"
+INDEX_VERSION = 1
+
+
+def _stamp(benchmark_dir: Path) -> list[int]:
+    # Runners rewrite kaprese.log on every prepare and append to it after running,
+    # so its mtime changes with the results even if they are nested deep
+    stamp = [benchmark_dir.stat().st_mtime_ns]
+    try:
+        stamp.append((benchmark_dir / "kaprese.log").stat().st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return stamp
+
+
+def _read_index(path: Path, key: str) -> dict[str, Any]:
+    try:
+        index = json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        logger.warning(f"Ignoring broken eval index: {path}")
+        return {}
+    if index.get("version") != INDEX_VERSION or index.get("key") != key:
+        return {}
+    return index.get("entries", {})
+
+
+def _write_index(path: Path, key: str, entries: dict[str, Any]) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(
+        json.dumps({"version": INDEX_VERSION, "key": key, "entries": entries})
+    )
+    tmp.replace(path)
+
+
+def scan_outputs[T](
+    output_directory: Path | str,
+    tool: str,
+    scan: Callable[[Path], T],
+    *,
+    key: str | None = None,
+    jobs: int = 16,
+) -> dict[str, T]:
+    """Scan the output directory of each benchmark of a tool in parallel
+
+    Results are kept in an index next to the benchmark directories and only the
+    directories changed since the last scan are scanned again. `key` identifies
+    the scanner, results of another key are never reused. Results must be JSON
+    serializable.
+    """
+    tool_dir = Path.cwd() / output_directory / tool
+    if not tool_dir.is_dir():
+        logger.warning(f"No outputs of {tool} in {tool_dir}")
+        return {}
+    index_path = tool_dir / INDEX_FILE
+    key = key or tool
+    cached = _read_index(index_path, key)
+
+    def scan_one(benchmark_dir: Path) -> tuple[str, list[int], T]:
+        stamp = _stamp(benchmark_dir)
+        entry = cached.get(benchmark_dir.name)
+        if entry is not None and entry["stamp"] == stamp:
+            return benchmark_dir.name, stamp, entry["result"]
+        return benchmark_dir.name, stamp, scan(benchmark_dir)
+
+    benchmark_dirs = [d for d in tool_dir.iterdir() if d.is_dir()]
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [executor.submit(scan_one, d) for d in benchmark_dirs]
+        try:
+            scanned = [future.result() for future in futures]
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    entries = {name: {"stamp": stamp, "result": r} for name, stamp, r in scanned}
+    rescanned = sum(
+        1 for name, stamp, _ in scanned if cached.get(name, {}).get("stamp") != stamp
+    )
+    logger.info(f"Scanned {rescanned} of {len(entries)} {tool} outputs")
+    if rescanned or len(entries) != len(cached):
+        _write_index(index_path, key, entries)
+    return {name: r for name, _, r in sorted(scanned)}
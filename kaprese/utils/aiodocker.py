@@ -0,0 +1,417 @@
+import asyncio
+import dataclasses
+import io
+import json
+import os
+import struct
+import tarfile
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote, urlencode, urlsplit
+
+from kaprese.utils.docker import (
+    _make_mount_dict,
+    _split_image,
+    docker_base_url,
+    invalidate_image_cache,
+)
+from kaprese.utils.logging import logger
+
+DEFAULT_DOCKER_SOCK = "/var/run/docker.sock"
+
+
+def _compact(buffer: bytearray, offset: int) -> int:
+    """Drop the consumed head of a buffer once it is at least half of it"""
+    if offset and offset * 2 >= len(buffer):
+        del buffer[:offset]
+        return 0
+    return offset
+
+
+class AsyncDockerError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+async def _open_connection() -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    base_url = docker_base_url() or os.environ.get(
+        "DOCKER_HOST", f"unix://{DEFAULT_DOCKER_SOCK}"
+    )
+    url = urlsplit(base_url)
+    if url.scheme in ("unix", "http+unix"):
+        # Both "unix:///var/run/docker.sock" and "unix://var/run/docker.sock"
+        path = url.path if url.netloc == "" else f"/{url.netloc}{url.path}"
+        return await asyncio.open_unix_connection(path)
+    if url.scheme in ("tcp", "http"):
+        return await asyncio.open_connection(url.hostname, url.port or 2375)
+    raise ValueError(f"Unsupported docker host for asyncio backend: {base_url}")
+
+
+class _Response:
+    def __init__(
+        self,
+        status: int,
+        headers: dict[str, str],
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self._reader = reader
+        self._writer = writer
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    return
+                yield await self._reader.readexactly(size)
+                await self._reader.readline()
+        elif (length := self.headers.get("content-length")) is not None:
+            if int(length) > 0:
+                yield await self._reader.readexactly(int(length))
+        else:
+            while chunk := await self._reader.read(65536):
+                yield chunk
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+    async def json(self) -> Any:
+        body = await self.read()
+        return json.loads(body) if body else None
+
+    async def iter_json(self) -> AsyncIterator[dict[str, Any]]:
+        """Iterate over a stream of JSON messages (pull and build progress)"""
+        buffer = bytearray()
+        start = 0
+        async for chunk in self.iter_chunks():
+            # Only the new chunk can end the pending line
+            scan = len(buffer)
+            buffer += chunk
+            while (end := buffer.find(b"\n", scan)) >= 0:
+                line = buffer[start:end]
+                start = scan = end + 1
+                if line.strip():
+                    yield json.loads(line)
+            start = _compact(buffer, start)
+        if buffer[start:].strip():
+            yield json.loads(buffer[start:])
+
+    async def iter_logs(self) -> AsyncIterator[bytes]:
+        """Demultiplex the log stream of a container started without TTY"""
+        buffer = bytearray()
+        offset = 0
+        async for chunk in self.iter_chunks():
+            buffer += chunk
+            while len(buffer) - offset >= 8:
+                _, size = struct.unpack_from(">BxxxL", buffer, offset)
+                if len(buffer) - offset < 8 + size:
+                    break
+                yield bytes(buffer[offset + 8 : offset + 8 + size])
+                offset += 8 + size
+            offset = _compact(buffer, offset)
+
+    async def raise_for_status(self) -> None:
+        if self.status < 400:
+            return
+        body = await self.read()
+        try:
+            message = json.loads(body).get("message", "")
+        except (json.JSONDecodeError, AttributeError):
+            message = body.decode(errors="replace")
+        raise AsyncDockerError(self.status, message)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+# Every request opens its own connection, so a single event loop can drive many
+# concurrent pulls, builds and container log streams
+@asynccontextmanager
+async def _request(
+    method: str,
+    path: str,
+    params: dict[str, Any] | None = None,
+    body: bytes | None = None,
+    headers: dict[str, str] | None = None,
+) -> AsyncGenerator[_Response, None]:
+    if params:
+        path = f"{path}?{urlencode(params)}"
+    reader, writer = await _open_connection()
+    request_headers = {
+        "Host": "docker",
+        "Connection": "close",
+        "Content-Length": str(len(body) if body is not None else 0),
+        **(headers or {}),
+    }
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\n".encode()
+        + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items()).encode()
+        + b"\r\n"
+        + (body or b"")
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    response_headers: dict[str, str] = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        key, _, value = line.decode().partition(":")
+        response_headers[key.strip().lower()] = value.strip()
+
+    response = _Response(status, response_headers, reader, writer)
+    try:
+        yield response
+    finally:
+        response.close()
+
+
+def _json_body(data: dict[str, Any]) -> tuple[bytes, dict[str, str]]:
+    return json.dumps(data).encode(), {"Content-Type": "application/json"}
+
+
+async def inspect_image(name: str) -> dict[str, Any] | None:
+    async with _request("GET", f"/images/{quote(name, safe='/:@')}/json") as r:
+        if r.status == 404:
+            return None
+        try:
+            await r.raise_for_status()
+        except AsyncDockerError as e:
+            logger.debug('Failed to inspect image "%s"', name)
+            logger.debug(e)
+            return None
+        return await r.json()
+
+
+async def image_exists(name: str) -> bool:
+    return await inspect_image(name) is not None
+
+
+async def pull_image(
+    name: str,
+    progress: Callable[[dict[str, Any]], None] | None = None,
+) -> bool:
+    repo, tag = _split_image(name)
+    # A digest stays in fromImage, there is no tag to pull then
+    params = {"fromImage": repo} if tag is None else {"fromImage": repo, "tag": tag}
+    logger.debug('Pulling image "%s"', name)
+    try:
+        async with _request("POST", "/images/create", params) as r:
+            await r.raise_for_status()
+            async for event in r.iter_json():
+                if "error" in event:
+                    logger.debug('Failed to pull image "%s"', name)
+                    logger.debug(event["error"])
+                    return False
+                if progress is not None:
+                    progress(event)
+    except AsyncDockerError as e:
+        logger.debug('Failed to pull image "%s"', name)
+        logger.debug(e)
+        return False
+    finally:
+        invalidate_image_cache(name)
+    return True
+
+
+def _make_context(basedir: str) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        archive.add(basedir, arcname=".")
+    return buffer.getvalue()
+
+
+async def build_image(
+    name: str,
+    basedir: str,
+    build_args: dict[str, str] | None = None,
+    *,
+    nocache: bool = False,
+    labels: dict[str, str] | None = None,
+) -> bool:
+    logger.debug('Building image "%s"', name)
+    logger.debug("  path: %s", basedir)
+    logger.debug("  buildargs: %s", build_args)
+    logger.debug("  labels: %s", labels)
+    params: dict[str, Any] = {
+        "t": name,
+        "buildargs": json.dumps(build_args or {}),
+        "labels": json.dumps(labels or {}),
+        "nocache": int(nocache),
+        "rm": 1,
+        "forcerm": 1,
+    }
+    body: bytes | None = None
+    headers: dict[str, str] = {}
+    if Path(basedir).expanduser().is_dir():
+        body = await asyncio.to_thread(_make_context, str(Path(basedir).expanduser()))
+        headers["Content-Type"] = "application/x-tar"
+    else:
+        # Remote contexts (git repositories) are fetched by the daemon
+        params["remote"] = basedir
+    try:
+        async with _request("POST", "/build", params, body, headers) as r:
+            await r.raise_for_status()
+            async for event in r.iter_json():
+                if "error" in event:
+                    logger.debug('Failed to build image "%s"', name)
+                    logger.debug(event["error"])
+                    return False
+                if "stream" in event:
+                    logger.debug(event["stream"].rstrip("\n"))
+    except AsyncDockerError as e:
+        logger.debug('Failed to build image "%s"', name)
+        logger.debug(e)
+        return False
+    finally:
+        invalidate_image_cache(name)
+    return True
+
+
+async def delete_image(name: str) -> None:
+    logger.debug('Deleting image "%s"', name)
+    async with _request("DELETE", f"/images/{quote(name, safe='/:@')}") as r:
+        if r.status != 404:
+            await r.raise_for_status()
+    invalidate_image_cache(name)
+
+
+async def _create_container(
+    image: str,
+    command: str | None,
+    workdir: str | None,
+    mount: dict[Path | str, Path | str] | None,
+) -> str:
+    config: dict[str, Any] = {"Image": image, "AttachStdout": True}
+    if command is not None:
+        config["Cmd"] = ["/bin/bash", "-c", command]
+    if workdir is not None:
+        config["WorkingDir"] = workdir
+    if mount is not None:
+        config["HostConfig"] = {
+            "Binds": [
+                f"{src}:{dst['bind']}:{dst['mode']}"
+                for src, dst in _make_mount_dict(mount).items()
+            ]
+        }
+    body, headers = _json_body(config)
+    async with _request("POST", "/containers/create", body=body, headers=headers) as r:
+        await r.raise_for_status()
+        return (await r.json())["Id"]
+
+
+async def _simple_request(method: str, path: str, **params: Any) -> Any:
+    async with _request(method, path, params or None) as r:
+        await r.raise_for_status()
+        return await r.json()
+
+
+@dataclasses.dataclass
+class AsyncDockerStreamResult:
+    stream: AsyncIterator[bytes] | None = None
+    return_code: int | None = None
+    container_id: str | None = None
+
+
+@asynccontextmanager
+async def run_command_stream(
+    image: str,
+    command: str | None,
+    workdir: str | None = None,
+    mount: dict[Path | str, Path | str] | None = None,
+) -> AsyncGenerator[AsyncDockerStreamResult, None]:
+    logger.debug("Running commands stream (asyncio)")
+    logger.debug("  image: %s", image)
+    logger.debug("  command: %s", command)
+    logger.debug("  workdir: %s", workdir)
+    logger.debug("  mount: %s", mount)
+
+    result = AsyncDockerStreamResult()
+    if not await image_exists(image):
+        logger.debug('Image "%s" does not exist', image)
+        yield result
+        return
+
+    try:
+        container = await _create_container(image, command, workdir, mount)
+    except AsyncDockerError as e:
+        _log_run_failure(command, image, e)
+        yield result
+        return
+    async with AsyncExitStack() as stack:
+        stack.push_async_callback(_remove_container, container)
+        # Failures of Docker fail this run only, not the other tasks of the loop
+        try:
+            await _simple_request("POST", f"/containers/{container}/start")
+            result.container_id = container
+            logs = await stack.enter_async_context(
+                _request(
+                    "GET",
+                    f"/containers/{container}/logs",
+                    {"follow": 1, "stdout": 1, "stderr": 1},
+                )
+            )
+            await logs.raise_for_status()
+        except AsyncDockerError as e:
+            _log_run_failure(command, image, e)
+            yield result
+            return
+        result.stream = logs.iter_logs()
+        yield result
+        logs.close()
+        try:
+            await _simple_request("POST", f"/containers/{container}/stop")
+            status = await _simple_request("POST", f"/containers/{container}/wait")
+            result.return_code = status["StatusCode"]
+        except AsyncDockerError as e:
+            _log_run_failure(command, image, e)
+
+
+def _log_run_failure(command: str | None, image: str, e: Exception) -> None:
+    logger.debug('Failed to run command "%s" in image "%s"', command, image)
+    logger.debug(e)
+
+
+async def _remove_container(container: str) -> None:
+    # Never hides the error the run failed with
+    try:
+        await _simple_request("DELETE", f"/containers/{container}", force=1)
+    except (AsyncDockerError, OSError) as e:
+        logger.debug('Failed to remove container "%s"', container)
+        logger.debug(e)
+
+
+@asynccontextmanager
+async def run_commands_stream(
+    image: str,
+    commands: list[str] | None,
+    workdir: str | None = None,
+    mount: dict[Path | str, Path | str] | None = None,
+) -> AsyncGenerator[AsyncDockerStreamResult, None]:
+    command = "; ".join(commands) if commands is not None else None
+    async with run_command_stream(image, command, workdir, mount) as result:
+        yield result
+
+
+async def run_command(
+    image: str,
+    command: str | None = None,
+    workdir: str | None = None,
+) -> str | None:
+    chunks: list[bytes] = []
+    async with run_command_stream(image, command, workdir) as result:
+        if result.stream is None:
+            return None
+        async for chunk in result.stream:
+            chunks.append(chunk)
+    if result.return_code != 0:
+        logger.debug('Failed to run command "%s" in image "%s"', command, image)
+        return None
+    return b"".join(chunks).decode()
@@ -0,0 +1,117 @@
+import gzip
+import time
+from collections.abc import Callable
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO
+
+# Longest unfinished line held back before it is written as it is
+MAX_PENDING_BYTES = 64 * 1024
+
+
+class OutputCapture:
+    """Write raw output to a file in whole lines, forwarding only sampled lines
+
+    Rotated files are named like `output.1.log`, `output.2.log`, ... (the
+    smaller the number, the newer the file) and compressed files get `.gz`.
+    Lines longer than MAX_PENDING_BYTES (or max_bytes) are written in parts.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        compress: bool = False,
+        max_bytes: int | None = None,
+        backups: int = 3,
+        sample: Callable[[str], None] | None = None,
+        sample_interval: float = 1.0,
+    ) -> None:
+        self.path = path.with_name(path.name + ".gz") if compress else path
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample = sample
+        self.sample_interval = sample_interval
+
+        self.total_bytes = 0
+        self._file_bytes = 0
+        self._pending = bytearray()
+        self._max_pending = min(max_bytes or MAX_PENDING_BYTES, MAX_PENDING_BYTES)
+        self._last_sample = float("-inf")
+        self._file = self._open()
+
+    def _open(self) -> BinaryIO:
+        if self.compress:
+            return gzip.open(self.path, "wb", compresslevel=1)  # type: ignore
+        return open(self.path, "wb")
+
+    def _rotated(self, index: int) -> Path:
+        stem, dot, suffixes = self.path.name.partition(".")
+        return self.path.with_name(f"{stem}.{index}{dot}{suffixes}")
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if (older := self._rotated(index)).exists():
+                older.replace(self._rotated(index + 1))
+        if self.backups > 0:
+            self.path.replace(self._rotated(1))
+        self._file = self._open()
+        self._file_bytes = 0
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file_bytes += len(data)
+        self.total_bytes += len(data)
+        if self.max_bytes is not None and self._file_bytes >= self.max_bytes:
+            self._rotate()
+
+    def _hold(self, data: bytes) -> None:
+        self._pending += data
+        # Output without newlines (e.g., progress bars redrawn with "\r") is
+        # written as a partial line rather than held back indefinitely
+        if len(self._pending) >= self._max_pending:
+            self._write(self._pending)
+            self._pending.clear()
+
+    def write(self, chunk: bytes) -> None:
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            self._hold(chunk)
+            return
+        # Only complete lines are written, so rotation never splits a line
+        if self._pending:
+            self._pending += chunk[:end]
+            data = bytes(self._pending)
+            self._pending.clear()
+        else:
+            data = chunk[:end]
+        self._write(data)
+        self._hold(chunk[end:])
+
+        if self.sample is None:
+            return
+        now = time.monotonic()
+        if now - self._last_sample >= self.sample_interval:
+            self._last_sample = now
+            last_line = data[data.rfind(b"\n", 0, len(data) - 1) + 1 : -1]
+            self.sample(last_line.decode(errors="replace"))
+
+    def close(self) -> None:
+        if self._pending:
+            self._file.write(self._pending)
+            self.total_bytes += len(self._pending)
+            self._pending.clear()
+        self._file.close()
+
+    def __enter__(self) -> "OutputCapture":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
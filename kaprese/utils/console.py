@@ -1,29 +1,40 @@
 import os
+from collections import deque
+from itertools import islice
 from typing import Any
 
-from rich.console import Console as DefaultConsole
-from rich.console import ConsoleOptions, RenderResult
+from rich.console import Console as DefaultConsole, ConsoleOptions, RenderResult
 from rich.text import Text
 
 
 class PanelConsole(DefaultConsole):
-    def __init__(self, *arg: Any, **kwargs: Any) -> None:
+    def __init__(self, *arg: Any, max_lines: int = 1000, **kwargs: Any) -> None:
         kwargs["file"] = open(os.devnull, "w")
         kwargs["record"] = True
         super().__init__(*arg, **kwargs)
-        self._logs: list[Text] = []
+        # Only the latest lines can be shown, keep a fixed-size ring buffer
+        self._logs: deque[Text] = deque(maxlen=max_lines)
+
+    def _ingest(self) -> None:
+        with self._record_buffer_lock:
+            records = self._record_buffer[:]
+            del self._record_buffer[:]
+        if not records:
+            return
+        texts = (Text(text, style or "") for text, style, _ in records)
+        for line in Text("").join(texts).split("\n"):
+            if line.cell_len == 0:
+                continue
+            line.no_wrap = True
+            line.overflow = "ellipsis"
+            self._logs.append(line)
 
     def __rich_console__(
         self, console: DefaultConsole, options: ConsoleOptions
     ) -> RenderResult:
-        texts = (Text(text, style or "") for text, style, _ in self._record_buffer)
-        lines = [line for line in Text("").join(texts).split("\n") if line.cell_len > 0]
-        for line in lines:
-            line.no_wrap = True
-            line.overflow = "ellipsis"
-        self._record_buffer.clear()
-        self._logs.extend(lines)
-        yield from (self._logs[-(options.max_height) :])
+        self._ingest()
+        height = options.max_height
+        yield from reversed(list(islice(reversed(self._logs), height)))
 
 
 console = DefaultConsole()
@@ -1,3 +1,6 @@
+import importlib.util
+import sys
+from types import ModuleType
 from typing import Any
 
 
@@ -8,3 +11,18 @@ class Singleton(type):
         if cls not in cls.__instances:
             cls.__instances[cls] = super().__call__(*args, **kwargs)
         return cls.__instances[cls]
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a module on the first access to one of its attributes"""
+    if (module := sys.modules.get(name)) is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,63 +1,410 @@
-from collections.abc import Generator
+from __future__ import annotations
+
+import contextvars
+import dataclasses
+import functools
+import io
+import posixpath
+import tarfile
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Generator
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, cast
-
-from docker.client import DockerClient  # type: ignore
-from docker.errors import (  # type: ignore
-    APIError,
-    BuildError,
-    ContainerError,
-    ImageNotFound,
-)
-from docker.models.containers import Container  # type: ignore
+from typing import TYPE_CHECKING, Any, cast
 
 from kaprese.core.config import CONFIGURE
+from kaprese.utils.design import lazy_import
 from kaprese.utils.logging import logger
+from kaprese.utils.tracing import span, traced
+
+if TYPE_CHECKING:
+    from docker.client import DockerClient  # type: ignore
+    from docker.models.containers import Container  # type: ignore
+
+# docker-py takes long to import, commands not talking to the daemon skip it
+docker = lazy_import("docker")
+
+# Upper bound of pooled connections per daemon, streaming runners hold one each
+DOCKER_MAX_POOL_SIZE = 64
+
+# Daemon used by the current thread instead of DOCKER_SOCK_PATH, see use_docker_host
+_docker_host: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "kaprese_docker_host", default=None
+)
+
+
+def docker_base_url() -> str | None:
+    return _docker_host.get() or CONFIGURE.DOCKER_SOCK_PATH
+
+
+@contextmanager
+def use_docker_host(base_url: str | None) -> Generator[None, None, None]:
+    """Talk to another daemon within the block, in the current thread only"""
+    token = _docker_host.set(base_url)
+    try:
+        yield
+    finally:
+        _docker_host.reset(token)
+
+
+def shares_filesystem(base_url: str | None) -> bool:
+    """Whether bind mounts of the daemon see the files of this machine"""
+    return not (base_url or "").startswith(("tcp://", "ssh://", "http://", "https://"))
+
+
+@dataclasses.dataclass
+class DockerClientStats:
+    clients_created: int = 0
+    client_requests: int = 0
+    connections_opened: int = 0
+    http_requests: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.http_requests - self.connections_opened, 0)
+
+
+@functools.cache
+def _unix_http_adapter() -> type:
+    class _UnixHTTPAdapter(docker.transport.UnixHTTPAdapter):
+        def get_connection(self, url: str, proxies: Any = None) -> Any:
+            # docker-py keeps one pool per request url, share one pool per socket
+            return super().get_connection("http+docker://localhost", proxies)
+
+    return _UnixHTTPAdapter
+
+
+def _make_docker_client(base_url: str | None) -> DockerClient:
+    client = docker.DockerClient(base_url=base_url, max_pool_size=DOCKER_MAX_POOL_SIZE)
+    adapter = getattr(client.api, "_custom_adapter", None)
+    if isinstance(adapter, docker.transport.UnixHTTPAdapter):
+        shared_adapter = _unix_http_adapter()(
+            f"http+unix://{adapter.socket_path}",
+            adapter.timeout,
+            max_pool_size=DOCKER_MAX_POOL_SIZE,
+        )
+        client.api.mount("http+docker://", shared_adapter)  # type: ignore
+        client.api._custom_adapter = shared_adapter  # type: ignore
+        adapter.close()
+    return client
+
+
+class _SharedDockerClient:
+    """One client per daemon, shared by all threads talking to it
+
+    The client of the default daemon is rebuilt when DOCKER_SOCK_PATH changes,
+    clients of other daemons (see use_docker_host) live until closed.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._default: tuple[str | None, DockerClient] | None = None
+        self._clients: dict[str, DockerClient] = {}
+        self._stats = DockerClientStats()
+
+    def _connect(self, base_url: str | None) -> DockerClient:
+        logger.debug('Connecting to Docker daemon "%s"', base_url)
+        self._stats.clients_created += 1
+        return _make_docker_client(base_url)
+
+    def _retire(self, client: DockerClient) -> None:
+        # Called with the lock held, keeps the counters of closed clients
+        connections, requests = _pool_counters(client)
+        self._stats.connections_opened += connections
+        self._stats.http_requests += requests
+        client.close()
+
+    def get(self) -> DockerClient:
+        host = _docker_host.get()
+        with self._lock:
+            self._stats.client_requests += 1
+            if host is not None:
+                if (client := self._clients.get(host)) is None:
+                    client = self._clients[host] = self._connect(host)
+                return client
+
+            base_url = CONFIGURE.DOCKER_SOCK_PATH
+            if self._default is not None and self._default[0] != base_url:
+                logger.debug('Docker daemon changed to "%s"', base_url)
+                self._retire(self._default[1])
+                self._default = None
+            if self._default is None:
+                self._default = (base_url, self._connect(base_url))
+            return self._default[1]
+
+    def _all_clients(self) -> list[DockerClient]:
+        clients = list(self._clients.values())
+        if self._default is not None:
+            clients.append(self._default[1])
+        return clients
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._all_clients():
+                self._retire(client)
+            self._clients.clear()
+            self._default = None
+
+    def stats(self) -> DockerClientStats:
+        with self._lock:
+            stats = dataclasses.replace(self._stats)
+            for client in self._all_clients():
+                connections, requests = _pool_counters(client)
+                stats.connections_opened += connections
+                stats.http_requests += requests
+            return stats
+
+
+def _pool_counters(client: DockerClient) -> tuple[int, int]:
+    """Best-effort counters from the urllib3 pools behind docker-py"""
+    connections, requests = 0, 0
+    adapters = getattr(getattr(client, "api", None), "adapters", None) or {}
+    for adapter in adapters.values():
+        pools = getattr(adapter, "pools", None)
+        if pools is None:
+            pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+        if pools is None or not hasattr(pools, "keys"):
+            continue
+        for key in pools.keys():
+            pool = pools.get(key)
+            # The unix socket pool of docker-py does not count its connections,
+            # fall back to the connections currently kept alive in the pool
+            queue = getattr(getattr(pool, "pool", None), "queue", None) or []
+            idle = [c for c in queue if c is not None]
+            connections += max(getattr(pool, "num_connections", 0), len(idle))
+            requests += getattr(pool, "num_requests", 0)
+    return connections, requests
+
+
+_shared_client = _SharedDockerClient()
 
 
 def get_docker_client() -> DockerClient:
-    return DockerClient(base_url=CONFIGURE.DOCKER_SOCK_PATH)
+    return _shared_client.get()
+
+
+def close_docker_client() -> None:
+    _shared_client.close()
+
+
+def docker_client_stats() -> DockerClientStats:
+    return _shared_client.stats()
+
+
+# Seconds to trust a known image state before asking the daemon again
+IMAGE_CACHE_TTL = 300.0
+
+
+def _image_key(name: str) -> str:
+    if "@" in name or ":" in name.rsplit("/", 1)[-1]:
+        return name
+    return f"{name}:latest"
+
+
+def _split_image(name: str) -> tuple[str, str | None]:
+    """Repository and tag of an image, no tag for a digest (repo@sha256:...)"""
+    if "@" in name:
+        return name, None
+    repo, sep, tag = name.rpartition(":")
+    # The colon of "registry:port/repo" is not a tag
+    if not sep or "/" in tag:
+        return name, "latest"
+    return repo, tag
+
+
+class _ImageCache:
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._images: dict[tuple[str | None, str], tuple[bool, float]] = {}
+
+    def get(self, name: str) -> bool | None:
+        key = (docker_base_url(), _image_key(name))
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is None:
+                return None
+            exists, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._images[key]
+                return None
+            return exists
+
+    def set(self, name: str, exists: bool) -> None:
+        key = (docker_base_url(), _image_key(name))
+        with self._lock:
+            self._images[key] = (exists, time.monotonic() + self.ttl)
+
+    def invalidate(self, name: str | None = None) -> None:
+        with self._lock:
+            if name is None:
+                self._images.clear()
+                return
+            key = _image_key(name)
+            for cached in [k for k in self._images if k[1] == key]:
+                del self._images[cached]
 
 
+_image_cache = _ImageCache(IMAGE_CACHE_TTL)
+
+
+def invalidate_image_cache(name: str | None = None) -> None:
+    _image_cache.invalidate(name)
+
+
+@traced("docker")
 def image_exists(name: str) -> bool:
+    if (exists := _image_cache.get(name)) is not None:
+        return exists
     client = get_docker_client()
     try:
-        return client.images.get(name) is not None  # type: ignore
-    except (ImageNotFound, APIError):
+        exists = client.images.get(name) is not None  # type: ignore
+    except docker.errors.ImageNotFound:
+        exists = False
+    except docker.errors.APIError:
         return False
+    _image_cache.set(name, exists)
+    return exists
+
+
+@traced("docker")
+def inspect_image(name: str) -> dict[str, Any] | None:
+    client = get_docker_client()
+    try:
+        image: dict[str, Any] = client.api.inspect_image(name)  # type: ignore
+    except docker.errors.ImageNotFound:
+        _image_cache.set(name, False)
+        return None
+    except docker.errors.APIError:
+        return None
+    _image_cache.set(name, True)
+    return image
+
+
+def image_labels(name: str) -> dict[str, str] | None:
+    image = inspect_image(name)
+    if image is None:
+        return None
+    return (image.get("Config") or {}).get("Labels") or {}
+
+
+@traced("docker")
+def images_exist(names: list[str]) -> dict[str, bool]:
+    """Check many images at once from a single listing of the local images"""
+    client = get_docker_client()
+    try:
+        images: list[dict[str, Any]] = client.api.images()  # type: ignore
+    except docker.errors.APIError as e:
+        logger.debug("Failed to list images")
+        logger.debug(e)
+        return {name: False for name in names}
+    local_images = {
+        _image_key(ref)
+        for image in images
+        for ref in [*(image.get("RepoTags") or []), *(image.get("RepoDigests") or [])]
+    }
+    exists = {name: _image_key(name) in local_images for name in names}
+    for name, found in exists.items():
+        _image_cache.set(name, found)
+    return exists
+
+
+type PullProgressCallback = Callable[[dict[str, Any]], None]
+
+
+class _InflightPull:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = False
+        self.callbacks: list[PullProgressCallback] = []
+
+    def notify(self, event: dict[str, Any]) -> None:
+        with _inflight_pulls_lock:
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback(event)
+
+
+_inflight_pulls: dict[tuple[str | None, str], _InflightPull] = {}
+_inflight_pulls_lock = threading.Lock()
+
+
+@traced("docker")
+def pull_image(name: str, progress: PullProgressCallback | None = None) -> bool:
+    """Pull an image, concurrent pulls of the same image share a single request"""
+    key = (docker_base_url(), _image_key(name))
+    with _inflight_pulls_lock:
+        pull = _inflight_pulls.get(key)
+        leader = pull is None
+        if pull is None:
+            pull = _inflight_pulls[key] = _InflightPull()
+        if progress is not None:
+            pull.callbacks.append(progress)
+
+    if not leader:
+        logger.debug('Waiting for in-flight pull of image "%s"', name)
+        pull.done.wait()
+        return pull.result
+
+    try:
+        pull.result = _pull_image(name, pull)
+    finally:
+        with _inflight_pulls_lock:
+            del _inflight_pulls[key]
+        pull.done.set()
+    return pull.result
 
 
-def pull_image(name: str) -> bool:
+def _pull_image(name: str, pull: _InflightPull) -> bool:
     client = get_docker_client()
-    repo, tag = name.split(":") if ":" in name else (name, "latest")
-    logger.debug('Pulling image "%s:%s"', repo, tag)
+    repo, tag = _split_image(name)
+    logger.debug('Pulling image "%s"', name)
     try:
-        return client.images.pull(repo, tag) is not None  # type: ignore
-    except APIError:
+        # docker-py takes the digest from the repository when there is no tag
+        for event in client.api.pull(repo, tag, stream=True, decode=True):  # type: ignore
+            if "error" in event:
+                logger.debug('Failed to pull image "%s"', name)
+                logger.debug(event["error"])
+                return False
+            pull.notify(event)
+    except docker.errors.APIError as e:
+        logger.debug('Failed to pull image "%s"', name)
+        logger.debug(e)
         return False
+    _image_cache.set(name, True)
+    return True
 
 
+@traced("docker")
 def delete_image(name: str) -> None:
     if not image_exists(name):
         logger.debug('Image "%s" does not exist', name)
         return
     logger.debug('Deleting image "%s"', name)
     client = get_docker_client()
-    client.images.remove(name)  # type: ignore
+    try:
+        client.images.remove(name)  # type: ignore
+    finally:
+        _image_cache.invalidate(name)
+    _image_cache.set(name, False)
 
 
+@traced("docker")
 def build_image(
     name: str,
     basedir: str,
     build_args: dict[str, str] | None = None,
     *,
     nocache: bool = False,
+    labels: dict[str, str] | None = None,
 ) -> bool:
     logger.debug('Building image "%s"', name)
     logger.debug("  path: %s", basedir)
     logger.debug("  tag: %s", name)
     logger.debug("  buildargs: %s", build_args)
+    logger.debug("  labels: %s", labels)
     client = get_docker_client()
     if build_args is None:
         build_args = {}
@@ -67,16 +414,20 @@ def build_image(
             tag=name,
             buildargs=build_args,
             nocache=nocache,
+            labels=labels or {},
             rm=True,
             forcerm=True,
         )
+        if image is not None:
+            _image_cache.set(name, True)
         return image is not None
-    except (BuildError, APIError) as e:
+    except (docker.errors.BuildError, docker.errors.APIError) as e:
         logger.debug('Failed to build image "%s"', name)
         logger.debug(e)
         return False
 
 
+@traced("docker")
 def run_command(
     image: str,
     command: str | None = None,
@@ -104,12 +455,87 @@ def run_command(
             **kwargs,
         )
         return out.decode()
-    except ContainerError as e:
+    except docker.errors.ContainerError as e:
         logger.debug('Failed to run command "%s" in image "%s"', command, image)
         logger.debug(e)
     return None
 
 
+@dataclasses.dataclass
+class ImageFiles:
+    workdir: str
+    files: dict[str, bytes | None]
+
+
+@traced("docker")
+def read_image_files(image: str, paths: list[str]) -> ImageFiles | None:
+    """Read files from an image without starting it, missing files map to None"""
+    client = get_docker_client()
+    try:
+        # Created but never started, the command is only required to create it
+        container: Container = client.containers.create(image, command="true")  # type: ignore
+    except docker.errors.APIError as e:
+        logger.debug('Failed to create container from image "%s"', image)
+        logger.debug(e)
+        return None
+    try:
+        workdir = container.attrs["Config"]["WorkingDir"] or "/"  # type: ignore
+        return ImageFiles(
+            workdir=workdir,
+            files={
+                # Relative paths are resolved against the working directory
+                path: _read_container_file(container, posixpath.join(workdir, path))
+                for path in paths
+            },
+        )
+    finally:
+        container.remove(force=True)  # type: ignore
+
+
+def _read_container_file(
+    container: Container, path: str, *, max_links: int = 8
+) -> bytes | None:
+    try:
+        bits, stat = container.get_archive(path)  # type: ignore
+        data = b"".join(bits)  # type: ignore
+    except (docker.errors.NotFound, docker.errors.APIError):
+        logger.debug('File "%s" does not exist in container', path)
+        return None
+    if (link := stat.get("linkTarget")) and max_links > 0:
+        target = posixpath.join(posixpath.dirname(path), link)
+        return _read_container_file(
+            container, posixpath.normpath(target), max_links=max_links - 1
+        )
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        member = archive.next()
+        if member is None or not member.isfile():
+            return None
+        file = archive.extractfile(member)
+        return file.read() if file is not None else None
+
+
+def _collect_dir(container: Container, path: str, dest: Path | str) -> None:
+    """Copy a directory out of a container, for daemons without bind mounts"""
+    try:
+        bits, _ = container.get_archive(path)  # type: ignore
+        # Spill large outputs to disk rather than keeping them in memory
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as buffer:
+            for chunk in bits:
+                buffer.write(chunk)
+            buffer.seek(0)
+            with tarfile.open(fileobj=buffer) as archive:
+                members = []
+                for member in archive:
+                    # Strip the directory itself, e.g., "kaprese-out/fixed.ml"
+                    member.name = member.name.partition("/")[2]
+                    if member.name:
+                        members.append(member)
+                archive.extractall(dest, members=members, filter="data")
+    except (docker.errors.NotFound, docker.errors.APIError) as e:
+        logger.debug('Failed to collect "%s" from container', path)
+        logger.debug(e)
+
+
 def _make_mount_dict(mount: dict[Path | str, Path | str]) -> dict[str, dict[str, str]]:
     return {
         str(Path(src).absolute()): {
@@ -124,9 +550,11 @@ class DockerStreamResult:
     def __init__(self) -> None:
         self.stream: Generator[bytes, None, None] | None = None
         self.return_code: int | None = None
+        self.container_id: str | None = None
 
 
 @contextmanager
+@traced("docker")
 def run_command_stream(
     image: str,
     command: str | None,
@@ -140,6 +568,14 @@ def run_command_stream(
     logger.debug("  mount: %s", mount)
     client = get_docker_client()
 
+    # Remote daemons cannot mount local directories, copy them out afterwards
+    collect: dict[Path | str, Path | str] = {}
+    if mount is not None and not shares_filesystem(docker_base_url()):
+        collect, mount = mount, None
+        if command is not None:
+            targets = " ".join(str(dst) for dst in collect.values())
+            command = f"mkdir -p {targets}; {command}"
+
     result = DockerStreamResult()
     if not image_exists(image):
         logger.debug('Image "%s" does not exist', image)
@@ -161,23 +597,37 @@ def run_command_stream(
                     "detach": True,
                 }
             )
-            container: Container = client.containers.run(image, **kwargs)  # type: ignore
+            with span("container start", "docker"):
+                container: Container = client.containers.run(image, **kwargs)  # type: ignore
+            result.container_id = container.id
 
             result.stream = cast(
                 Generator[bytes, None, None],
                 container.logs(stream=True),  # type: ignore
             )
             yield result
-            container.stop()  # type: ignore
-            container_status = cast(dict[str, Any], container.wait())  # type: ignore
-            result.return_code = container_status["StatusCode"]
-            container.remove()  # type: ignore
-        except ContainerError as e:
+            with span("container teardown", "docker"):
+                container.stop()  # type: ignore
+                container_status = cast(dict[str, Any], container.wait())  # type: ignore
+                result.return_code = container_status["StatusCode"]
+                if collect:
+                    with span("collect outputs", "docker"):
+                        for src, dst in collect.items():
+                            _collect_dir(container, str(dst), src)
+                container.remove()  # type: ignore
+        except docker.errors.ContainerError as e:
             logger.debug('Failed to run command "%s" in image "%s"', command, image)
             logger.debug(e)
     return None
 
 
+@traced("docker")
+def container_stats(container_id: str) -> Generator[dict[str, Any], None, None]:
+    """Stream the resource usage of a running container, about once a second"""
+    client = get_docker_client()
+    yield from client.api.stats(container_id, stream=True, decode=True)
+
+
 @contextmanager
 def run_commands_stream(
     image: str,
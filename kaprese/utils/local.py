@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, cast
+
+from kaprese.utils.logging import logger
+from kaprese.utils.tracing import span, traced
+
+# Bytes read from the output pipe at once
+_READ_SIZE = 64 * 1024
+
+
+class LocalStreamResult:
+    def __init__(self) -> None:
+        self.stream: Generator[bytes, None, None] | None = None
+        self.return_code: int | None = None
+        # Local processes have no container, kept to match DockerStreamResult
+        self.container_id: str | None = None
+
+
+@contextmanager
+def sandbox(
+    sources: Path | str, prefix: str = "kaprese-"
+) -> Generator[Path, None, None]:
+    """Copy sources into a temporary directory, removed on exit"""
+    root = Path(tempfile.mkdtemp(prefix=prefix))
+    try:
+        workdir = root / "workdir"
+        with span("copy sources", "local"):
+            shutil.copytree(sources, workdir, symlinks=True)
+        yield workdir
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _read(stdout: IO[bytes]) -> Generator[bytes, None, None]:
+    while chunk := stdout.read1(_READ_SIZE):  # type: ignore
+        yield chunk
+
+
+def _kill(process: subprocess.Popen[bytes]) -> None:
+    # Commands run in their own session, kill everything they started
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+@contextmanager
+@traced("local")
+def run_command_stream(
+    command: str | None,
+    workdir: Path | str,
+) -> Generator[LocalStreamResult, None, None]:
+    logger.debug("Running local commands stream")
+    logger.debug("  command: %s", command)
+    logger.debug("  workdir: %s", workdir)
+
+    result = LocalStreamResult()
+    if command is None:
+        yield result
+        return None
+    try:
+        process = subprocess.Popen(
+            ["/bin/bash", "-c", command],
+            cwd=workdir,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    except OSError as e:
+        logger.debug('Failed to run command "%s" in "%s"', command, workdir)
+        logger.debug(e)
+        yield result
+        return None
+
+    stdout = cast(IO[bytes], process.stdout)
+    result.stream = _read(stdout)
+    try:
+        yield result
+        # The stream ends when the output is closed, the commands may still run
+        result.return_code = process.wait()
+    finally:
+        if process.poll() is None:
+            _kill(process)
+            process.wait()
+        stdout.close()
+    return None
+
+
+@contextmanager
+def run_commands_stream(
+    commands: list[str] | None,
+    workdir: Path | str,
+) -> Generator[LocalStreamResult, None, None]:
+    command = "; ".join(commands) if commands is not None else None
+    with run_command_stream(command, workdir) as result:
+        yield result
+    return None
@@ -1,3 +1,4 @@
+import contextvars
 import logging
 import os
 from collections.abc import Generator
@@ -5,25 +6,45 @@ from contextlib import contextmanager
 from pathlib import Path
 from typing import Literal
 
-from rich.logging import RichHandler
-
-from kaprese.utils.console import console
-
 FORMAT = "%(message)s"
 DATE_FORMAT = "[%X]"
 
 _log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
 
-_hander = RichHandler(
-    console=console,
-    show_path=_log_level == "DEBUG",
-)
+
+class _ConsoleHandler(logging.Handler):
+    """Rich handler on the shared console, Rich is imported at the first record"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._handler: logging.Handler | None = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._handler is None:
+            from rich.logging import RichHandler
+
+            from kaprese.utils.console import console
+
+            self._handler = RichHandler(
+                console=console,
+                show_path=_log_level == "DEBUG",
+            )
+            self._handler.setFormatter(self.formatter)
+        self._handler.emit(record)
+
+
+_hander = _ConsoleHandler()
 _hander.setFormatter(logging.Formatter(fmt=FORMAT, datefmt=DATE_FORMAT))
 
 logger = logging.getLogger("kaprese")
 logger.addHandler(_hander)
 logger.setLevel(_log_level)
 
+# File handler of the runner owning the current thread or asyncio task
+_current_filelog: contextvars.ContextVar[logging.Handler | None] = (
+    contextvars.ContextVar("kaprese_filelog", default=None)
+)
+
 
 @contextmanager
 def enable_filelogging(
@@ -38,9 +59,14 @@ def enable_filelogging(
         )
     )
     handler.setLevel("INFO" if _log_level != "DEBUG" else _log_level)
+    # Runners may log concurrently (threads or asyncio tasks), keep only the
+    # records emitted from the context that enabled this file
+    handler.addFilter(lambda _: _current_filelog.get() is handler)
+    token = _current_filelog.set(handler)
     logger.addHandler(handler)
     try:
         yield
     finally:
         logger.removeHandler(handler)
+        _current_filelog.reset(token)
         handler.close()
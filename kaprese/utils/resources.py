@@ -0,0 +1,112 @@
+import contextvars
+import dataclasses
+import threading
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import Any
+
+from kaprese.utils.docker import container_stats
+from kaprese.utils.logging import logger
+
+RESOURCES_HEADER = "time,cpu_seconds,memory,memory_peak,block_read,block_write,pids\n"
+
+
+@dataclasses.dataclass
+class ResourceUsage:
+    samples: int = 0
+    cpu_seconds: float = 0.0
+    memory_peak: int = 0
+    block_read: int = 0
+    block_write: int = 0
+    pids_peak: int = 0
+
+
+def _block_io(stats: dict[str, Any]) -> tuple[int, int]:
+    read = write = 0
+    for entry in (stats.get("blkio_stats") or {}).get(
+        "io_service_bytes_recursive"
+    ) or []:
+        op = entry.get("op", "").lower()
+        if op == "read":
+            read += entry.get("value", 0)
+        elif op == "write":
+            write += entry.get("value", 0)
+    return read, write
+
+
+class ResourceSampler:
+    """Record the resource usage of a container from the Docker stats stream
+
+    Samples are written as CSV lines of integers (seconds since start, bytes)
+    except CPU time, the stream ends when the container stops.
+    """
+
+    def __init__(self, container_id: str, path: Path) -> None:
+        self.container_id = container_id
+        self.path = path
+        self.usage = ResourceUsage()
+        self._file = open(path, "w")
+        self._file.write(RESOURCES_HEADER)
+        self._start = time.monotonic()
+        # Sample from the Docker host of the calling thread
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=context.run, args=(self._sample,), daemon=True
+        )
+        self._thread.start()
+
+    def _sample(self) -> None:
+        try:
+            for stats in container_stats(self.container_id):
+                self._record(stats)
+        except Exception as e:
+            logger.debug(
+                "Stopped sampling resources of container %s: %s",
+                self.container_id,
+                e,
+            )
+
+    def _record(self, stats: dict[str, Any]) -> None:
+        # The daemon sends an empty sample once the container stopped
+        if not (memory_stats := stats.get("memory_stats")):
+            return
+        usage = self.usage
+        cpu = (stats.get("cpu_stats") or {}).get("cpu_usage", {}).get("total_usage")
+        memory = memory_stats.get("usage", 0)
+        block_read, block_write = _block_io(stats)
+        pids = (stats.get("pids_stats") or {}).get("current", 0)
+
+        usage.samples += 1
+        if cpu is not None:
+            usage.cpu_seconds = cpu / 1e9
+        # cgroup v2 does not report max_usage, keep the peak of the samples too
+        usage.memory_peak = max(
+            usage.memory_peak, memory, memory_stats.get("max_usage", 0)
+        )
+        usage.block_read = block_read
+        usage.block_write = block_write
+        usage.pids_peak = max(usage.pids_peak, pids)
+        self._file.write(
+            f"{time.monotonic() - self._start:.1f},{usage.cpu_seconds:.3f},"
+            f"{memory},{usage.memory_peak},{block_read},{block_write},{pids}\n"
+        )
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.debug(
+                "Resource sampler of container %s did not stop", self.container_id
+            )
+        self._file.close()
+
+    def __enter__(self) -> "ResourceSampler":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
@@ -0,0 +1,163 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any
+
+
+class Tracer:
+    """Write Chrome Trace Event spans as a JSON array, viewable in Perfetto"""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._file: IO[str] = open(self.path, "w")
+        self._file.write("[\n")
+        self._lock = threading.Lock()
+        self._first = True
+        self._threads: set[int] = set()
+        self._pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+
+    def now(self) -> float:
+        """Microseconds since the tracer started"""
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    def _write(self, event: dict[str, Any]) -> None:
+        # Called with the lock held
+        self._file.write(("" if self._first else ",\n") + json.dumps(event))
+        self._first = False
+
+    def complete(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        end: float,
+        args: dict[str, Any] | None = None,
+    ) -> None:
+        tid, thread_name = _track()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start,
+            "dur": end - start,
+            "pid": self._pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            # Spans still open in other threads may end after the trace is closed
+            if self._file.closed:
+                return
+            if tid not in self._threads:
+                self._threads.add(tid)
+                self._write(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self._pid,
+                        "tid": tid,
+                        "args": {"name": thread_name},
+                    }
+                )
+            self._write(event)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.write("\n]\n")
+            self._file.close()
+
+
+def _track() -> tuple[int, str]:
+    """Id and name of the current thread, or asyncio task as tasks interleave"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return id(task), task.get_name()
+    return threading.get_ident(), threading.current_thread().name
+
+
+_tracer: Tracer | None = None
+
+
+class _Span:
+    def __init__(
+        self, tracer: Tracer, name: str, category: str, args: dict[str, Any]
+    ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self.start = self.tracer.now()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.args["error"] = exc_type.__name__
+        self.tracer.complete(
+            self.name, self.category, self.start, self.tracer.now(), self.args
+        )
+
+
+def span(
+    name: str, category: str = "kaprese", **args: Any
+) -> _Span | nullcontext[None]:
+    """Record the enclosed block as a span if tracing is enabled"""
+    if _tracer is None:
+        return nullcontext()
+    return _Span(_tracer, name, category, args)
+
+
+def traced[**P, R](
+    category: str,
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Record every call of a function as a span, generators span their lifetime"""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        name = func.__name__
+        if inspect.isgeneratorfunction(func):
+
+            @functools.wraps(func)
+            def generator_wrapper(*args: P.args, **kwargs: P.kwargs) -> Any:
+                with span(name, category):
+                    return (yield from func(*args, **kwargs))  # type: ignore
+
+            return generator_wrapper  # type: ignore
+
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with span(name, category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def tracing(path: Path | str) -> Generator[Tracer, None, None]:
+    global _tracer
+    tracer = _tracer = Tracer(path)
+    try:
+        yield tracer
+    finally:
+        _tracer = None
+        tracer.close()
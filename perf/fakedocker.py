@@ -0,0 +1,429 @@
+"""A stand-in for the Docker daemon serving the Engine API on a unix socket
+
+Images, pulls, builds and containers are simulated with configurable
+latencies and output volume, so kaprese can be driven without a daemon:
+
+    python perf/fakedocker.py --socket /tmp/fakedocker.sock --run-duration 1
+    kaprese config set DOCKER_SOCK_PATH=unix:///tmp/fakedocker.sock
+"""
+
+import argparse
+import base64
+import dataclasses
+import io
+import itertools
+import json
+import os
+import re
+import socketserver
+import struct
+import tarfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from types import TracebackType
+from typing import Any
+from urllib.parse import parse_qs, unquote, urlsplit
+
+_API_PREFIX = re.compile(r"^/v[\d.]+")
+
+
+@dataclasses.dataclass
+class FakeDockerConfig:
+    # Latency of every API request
+    api_latency: float = 0.0
+    pull_latency: float = 0.0
+    build_latency: float = 0.0
+    start_latency: float = 0.0
+    # Time for a container to write its output and exit
+    run_duration: float = 0.0
+    output_lines: int = 10
+    output_line_bytes: int = 80
+    exit_code: int = 0
+    # Every image exists unless deleted, otherwise images must be pulled or built
+    all_images: bool = True
+    workdir: str = "/workspace"
+    files: dict[str, bytes] = dataclasses.field(
+        default_factory=lambda: {
+            "/etc/os-release": b'ID=debian\nVERSION_ID="12"\n',
+            "/workspace/metadata.json": b'{"language": "ocaml", "buggyPath": "."}',
+        }
+    )
+
+
+def _image_key(name: str) -> str:
+    return name if ":" in name.rsplit("/", 1)[-1] else f"{name}:latest"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, code: int, body: Any = None) -> None:
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type: str = "application/json") -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            return self.rfile.read(length)
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while size := int(self.rfile.readline().split(b";")[0], 16):
+                body += self.rfile.read(size)
+                self.rfile.readline()
+            self.rfile.readline()
+            return body
+        return b""
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        path = _API_PREFIX.sub("", unquote(url.path))
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        docker = self.server.docker
+        docker.requests[f"{method} {_route(path)}"] += 1
+        if docker.config.api_latency:
+            time.sleep(docker.config.api_latency)
+        body = self._read_body() if method in ("POST", "PUT") else b""
+        docker.handle(self, method, path, query, body)
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_HEAD(self) -> None:
+        self._dispatch("HEAD")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_PUT(self) -> None:
+        self._dispatch("PUT")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+
+def _route(path: str) -> str:
+    path = re.sub(r"^/images/.+?(/json)?$", r"/images/{name}\1", path)
+    return re.sub(r"^/containers/[^/]+/", "/containers/{id}/", path)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 1024
+    docker: "FakeDocker"
+
+
+class FakeDocker:
+    def __init__(
+        self,
+        socket_path: str,
+        config: FakeDockerConfig | None = None,
+    ) -> None:
+        self.socket_path = socket_path
+        self.config = config or FakeDockerConfig()
+        self.requests: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._images: dict[str, dict[str, str]] = {}
+        self._deleted: set[str] = set()
+        self._containers: dict[str, dict[str, Any]] = {}
+        self._ids = itertools.count()
+        self._server: _Server | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"unix://{self.socket_path}"
+
+    def start(self) -> "FakeDocker":
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.docker = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def __enter__(self) -> "FakeDocker":
+        return self.start()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.stop()
+
+    # Images
+
+    def add_image(self, name: str, labels: dict[str, str] | None = None) -> None:
+        with self._lock:
+            key = _image_key(name)
+            self._images[key] = labels or {}
+            self._deleted.discard(key)
+
+    def _image(self, name: str) -> dict[str, str] | None:
+        key = _image_key(name)
+        with self._lock:
+            if key in self._images:
+                return self._images[key]
+            if self.config.all_images and key not in self._deleted:
+                return {}
+        return None
+
+    def _inspect_image(self, name: str, labels: dict[str, str]) -> dict[str, Any]:
+        key = _image_key(name)
+        return {
+            "Id": f"sha256:{key}",
+            "RepoTags": [key],
+            "RepoDigests": [],
+            "Config": {"WorkingDir": self.config.workdir, "Labels": labels},
+        }
+
+    # Requests
+
+    def handle(
+        self,
+        h: _Handler,
+        method: str,
+        path: str,
+        query: dict[str, str],
+        body: bytes,
+    ) -> None:
+        if path == "/_ping":
+            h.send_response(200)
+            h.send_header("Content-Length", "2")
+            h.end_headers()
+            h.wfile.write(b"OK")
+            return
+        if path == "/version":
+            return h._send(200, {"ApiVersion": "1.43", "Version": "24.0.0"})
+
+        if path == "/images/json":
+            with self._lock:
+                tags = list(self._images)
+            return h._send(200, [{"Id": f"sha256:{t}", "RepoTags": [t]} for t in tags])
+        if path == "/images/create" and method == "POST":
+            return self._pull(h, f"{query['fromImage']}:{query.get('tag', 'latest')}")
+        if path == "/build" and method == "POST":
+            return self._build(h, query)
+        if m := re.match(r"^/images/(.+)/json$", path):
+            labels = self._image(m.group(1))
+            if labels is None:
+                return h._send(404, {"message": f"No such image: {m.group(1)}"})
+            return h._send(200, self._inspect_image(m.group(1), labels))
+        if (m := re.match(r"^/images/(.+)$", path)) and method == "DELETE":
+            key = _image_key(m.group(1))
+            with self._lock:
+                self._images.pop(key, None)
+                self._deleted.add(key)
+            return h._send(200, [{"Deleted": key}])
+
+        if path == "/containers/create" and method == "POST":
+            return self._create(h, json.loads(body or b"{}"))
+        if m := re.match(r"^/containers/([^/]+)(/[a-z]+)?$", path):
+            return self._container(h, method, m.group(1), m.group(2) or "", query)
+        h._send(404, {"message": f"page not found: {method} {path}"})
+
+    def _pull(self, h: _Handler, name: str) -> None:
+        h._start_chunked()
+        steps = 5
+        for i in range(1, steps + 1):
+            time.sleep(self.config.pull_latency / steps)
+            event = {
+                "status": "Downloading",
+                "id": "layer",
+                "progressDetail": {"current": i * 1000, "total": steps * 1000},
+            }
+            h._chunk(json.dumps(event).encode() + b"\r\n")
+        h._chunk(json.dumps({"status": "Pull complete", "id": "layer"}).encode())
+        h._end_chunked()
+        self.add_image(name)
+
+    def _build(self, h: _Handler, query: dict[str, str]) -> None:
+        time.sleep(self.config.build_latency)
+        name = query["t"]
+        self.add_image(name, json.loads(query.get("labels") or "{}"))
+        h._start_chunked()
+        h._chunk(b'{"stream": "Step 1/1 : FROM fake\\n"}\r\n')
+        h._chunk(json.dumps({"aux": {"ID": f"sha256:{name}"}}).encode() + b"\r\n")
+        h._end_chunked()
+
+    def _create(self, h: _Handler, config: dict[str, Any]) -> None:
+        if self._image(config.get("Image", "")) is None:
+            return h._send(404, {"message": f"No such image: {config.get('Image')}"})
+        container_id = f"{next(self._ids):064x}"
+        with self._lock:
+            self._containers[container_id] = {"config": config, "started": None}
+        h._send(201, {"Id": container_id, "Warnings": []})
+
+    def _container(
+        self,
+        h: _Handler,
+        method: str,
+        container_id: str,
+        action: str,
+        query: dict[str, str],
+    ) -> None:
+        with self._lock:
+            container = self._containers.get(container_id)
+        if container is None:
+            return h._send(404, {"message": f"No such container: {container_id}"})
+        config = container["config"]
+
+        if action == "" and method == "DELETE":
+            with self._lock:
+                self._containers.pop(container_id, None)
+            return h._send(204)
+        if action == "/json":
+            return h._send(
+                200,
+                {
+                    "Id": container_id,
+                    "Image": config.get("Image"),
+                    "Config": {
+                        "Tty": False,
+                        "WorkingDir": config.get("WorkingDir") or self.config.workdir,
+                        "Image": config.get("Image"),
+                    },
+                    "State": {"Running": container["started"] is not None},
+                },
+            )
+        if action == "/start":
+            time.sleep(self.config.start_latency)
+            container["started"] = time.monotonic()
+            return h._send(204)
+        if action == "/logs":
+            return self._logs(h, container)
+        if action in ("/stop", "/kill"):
+            return h._send(204)
+        if action == "/wait":
+            return h._send(200, {"StatusCode": self.config.exit_code})
+        if action == "/archive":
+            return self._archive(h, query["path"])
+        if action == "/stats":
+            return self._stats(h, container)
+        h._send(404, {"message": f"page not found: {method} {action}"})
+
+    def _logs(self, h: _Handler, container: dict[str, Any]) -> None:
+        h._start_chunked("application/vnd.docker.raw-stream")
+        lines = self.config.output_lines
+        line = b"x" * max(self.config.output_line_bytes - 1, 0) + b"\n"
+        frame = struct.pack(">BxxxL", 1, len(line)) + line
+        started = container["started"] or time.monotonic()
+        for i in range(lines):
+            # Spread the output over the run duration
+            delay = started + self.config.run_duration * (i + 1) / lines
+            if (wait := delay - time.monotonic()) > 0:
+                time.sleep(wait)
+            h._chunk(frame)
+        if lines == 0:
+            time.sleep(max(started + self.config.run_duration - time.monotonic(), 0))
+        h._end_chunked()
+
+    def _archive(self, h: _Handler, path: str) -> None:
+        # A directory is archived with the files below it
+        path = path.rstrip("/")
+        prefix = path + "/"
+        files = {
+            name: data
+            for name, data in self.config.files.items()
+            if name == path or name.startswith(prefix)
+        }
+        if not files:
+            return h._send(404, {"message": f"Could not find the file {path}"})
+        buffer = io.BytesIO()
+        parent = path.rsplit("/", 1)[0] + "/"
+        with tarfile.open(fileobj=buffer, mode="w") as archive:
+            for name, data in files.items():
+                info = tarfile.TarInfo(name.removeprefix(parent))
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        tar = buffer.getvalue()
+        name = path.rsplit("/", 1)[-1]
+        size = len(files[path]) if path in files else 4096
+        stat = json.dumps({"name": name, "size": size, "linkTarget": ""})
+        h.send_response(200)
+        h.send_header("Content-Type", "application/x-tar")
+        h.send_header(
+            "X-Docker-Container-Path-Stat", base64.b64encode(stat.encode()).decode()
+        )
+        h.send_header("Content-Length", str(len(tar)))
+        h.end_headers()
+        h.wfile.write(tar)
+
+    def _stats(self, h: _Handler, container: dict[str, Any]) -> None:
+        h._start_chunked()
+        started = container["started"] or time.monotonic()
+        while (elapsed := time.monotonic() - started) < self.config.run_duration:
+            sample = {
+                "cpu_stats": {"cpu_usage": {"total_usage": int(elapsed * 1e9)}},
+                "memory_stats": {"usage": 64 * 1024 * 1024},
+                "pids_stats": {"current": 1},
+                "blkio_stats": {"io_service_bytes_recursive": []},
+            }
+            h._chunk(json.dumps(sample).encode() + b"\n")
+            time.sleep(min(1.0, self.config.run_duration))
+        h._chunk(b'{"memory_stats": {}}\n')
+        h._end_chunked()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default="/tmp/fakedocker.sock")
+    for field in dataclasses.fields(FakeDockerConfig):
+        if field.type in ("float", "int", float, int):
+            parser.add_argument(
+                f"--{field.name.replace('_', '-')}",
+                type=float if field.type in ("float", float) else int,
+                default=field.default,
+            )
+    parser.add_argument("--no-images", action="store_true", help="start empty")
+    args = parser.parse_args()
+    config = FakeDockerConfig(
+        **{
+            f.name: getattr(args, f.name)
+            for f in dataclasses.fields(FakeDockerConfig)
+            if hasattr(args, f.name)
+        },
+    )
+    config.all_images = not args.no_images
+    with FakeDocker(args.socket, config) as docker:
+        print(f"Serving the fake Docker Engine API on {docker.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
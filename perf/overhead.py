@@ -0,0 +1,210 @@
+"""Measure the controller overhead of kaprese against a fake Docker daemon
+
+Each scenario runs in a fresh process with its own config directory, so the
+numbers only include kaprese itself:
+
+    python perf/overhead.py --sizes 10 100 1000 --scenarios run run-async list eval
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fakedocker import FakeDocker, FakeDockerConfig  # noqa: E402
+
+SCENARIOS = ["run", "run-async", "list", "eval"]
+ENGINE = "cafe"
+
+
+def _max_rss() -> int:
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _setup(config_dir: Path, socket: str, size: int) -> None:
+    from kaprese.core.config import CONFIGURE
+    from kaprese.core.engine import Engine
+    from kaprese.core.registry import get_registry
+
+    CONFIGURE.CONFIG_PATH = config_dir
+    CONFIGURE.DOCKER_SOCK_PATH = f"unix://{socket}"
+    get_registry()._insert_many(
+        "benchmarks",
+        [
+            {
+                "name": f"fake-{i}",
+                "image": f"fake/benchmark:fake-{i}",
+                "metadata_file": "metadata.json",
+            }
+            for i in range(size)
+        ],
+        overwrite=True,
+    )
+    location = config_dir / "engine"
+    location.mkdir()
+    (location / "Dockerfile").write_text("FROM scratch\n")
+    Engine(
+        ENGINE,
+        supported_languages=["ocaml"],
+        supported_os=["debian:12"],
+        image="fake/engine",
+        location=str(location),
+        exec_commands=["true"],
+    ).register(overwrite=True)
+
+
+def _make_outputs(output: Path, size: int) -> None:
+    """Output tree of a finished run, every other benchmark is fixed"""
+    from kaprese.core.journal import Journal
+
+    with Journal(output) as journal:
+        for i in range(size):
+            benchmark_dir = output / ENGINE / f"fake-{i}"
+            benchmark_dir.mkdir(parents=True)
+            (benchmark_dir / "kaprese.log").write_text("fake\n")
+            if i % 2 == 0:
+                (benchmark_dir / "fixed.ml").write_text("let x = 1\n")
+            journal.record(ENGINE, f"fake-{i}", "run", True, return_code=0, elapsed=1.0)
+
+
+def _measure(argv: list[str]) -> dict[str, float]:
+    from kaprese.bin.kaprese import main
+
+    rss = _max_rss()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    main(argv)
+    return {
+        "wall": time.perf_counter() - wall,
+        "cpu": time.process_time() - cpu,
+        "rss_growth": _max_rss() - rss,
+    }
+
+
+def child(scenario: str, size: int, socket: str, jobs: int) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="kaprese-perf-") as tmp:
+        tmp_dir = Path(tmp)
+        config_dir = tmp_dir / "config"
+        output = tmp_dir / "output"
+        _setup(config_dir, socket, size)
+
+        from kaprese.utils.console import console
+
+        console.quiet = True
+        common = ["--kaprese-config", str(config_dir)]
+        if scenario in ("run", "run-async"):
+            backend = "async" if scenario == "run-async" else "docker"
+            result = _measure(
+                common
+                + ["run", "-e", ENGINE, "-j", str(jobs), "-o", str(output)]
+                + ["--backend", backend, "--no-wait"]
+            )
+            from kaprese.core.journal import latest_runs
+
+            # Pairs that did not run would make the overhead look small
+            runs = latest_runs(output).values()
+            result["ok"] = sum(run["ok"] for run in runs)
+        elif scenario == "list":
+            result = _measure(common + ["benchmark", "list", "-d"])
+        elif scenario == "eval":
+            _make_outputs(output, size)
+            argv = common + ["eval", "-e", ENGINE, "-o", str(output)]
+            result = _measure(argv)
+            # Second pass hits the index of unchanged outputs
+            result["warm_wall"] = _measure(argv)["wall"]
+        else:
+            raise ValueError(f"Unknown scenario: {scenario}")
+    return {"scenario": scenario, "size": size, **result}
+
+
+def _format_row(result: dict[str, Any]) -> str:
+    size = result["size"]
+    row = (
+        f"{result['scenario']:<9} {size:>7} {result['wall']:>9.2f}s "
+        f"{result['cpu']:>9.2f}s {result['cpu'] / size * 1e3:>10.3f}ms "
+        f"{result['rss_growth'] / 2**20:>8.1f}MiB"
+    )
+    if "ok" in result and result["ok"] != size:
+        row += f"  ({size - result['ok']} pairs failed)"
+    if "warm_wall" in result:
+        row += f"  (warm {result['warm_wall']:.2f}s)"
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="*", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument(
+        "--sizes",
+        nargs="*",
+        type=int,
+        default=[10, 100, 1000],
+        help="numbers of engine/benchmark pairs (up to 100000)",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=16)
+    parser.add_argument("--run-duration", type=float, default=0.0)
+    parser.add_argument("--api-latency", type=float, default=0.0)
+    parser.add_argument("--output-lines", type=int, default=10)
+    parser.add_argument("--output-line-bytes", type=int, default=80)
+    parser.add_argument("--json", default=None, help="write results to a JSON file")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        scenario, size, socket = args.child
+        print(json.dumps(child(scenario, int(size), socket, args.jobs)))
+        return
+
+    config = FakeDockerConfig(
+        api_latency=args.api_latency,
+        run_duration=args.run_duration,
+        output_lines=args.output_lines,
+        output_line_bytes=args.output_line_bytes,
+    )
+    results = []
+    with tempfile.TemporaryDirectory(prefix="kaprese-perf-") as tmp:
+        socket = os.path.join(tmp, "docker.sock")
+        with FakeDocker(socket, config) as docker:
+            print(
+                f"{'':<9} {'pairs':>7} {'wall':>10} {'cpu':>10} "
+                f"{'cpu/pair':>12} {'rss growth':>11}"
+            )
+            for scenario in args.scenarios:
+                for size in args.sizes:
+                    completed = subprocess.run(
+                        [
+                            sys.executable,
+                            __file__,
+                            "-j",
+                            str(args.jobs),
+                            "--child",
+                            scenario,
+                            str(size),
+                            socket,
+                        ],
+                        stdout=subprocess.PIPE,
+                        text=True,
+                    )
+                    if completed.returncode != 0:
+                        print(f"{scenario:<9} {size:>7} failed", file=sys.stderr)
+                        continue
+                    result = json.loads(completed.stdout.splitlines()[-1])
+                    results.append(result)
+                    print(_format_row(result), flush=True)
+            requests = sum(docker.requests.values())
+            print(f"Fake daemon served {requests} requests")
+    if args.json is not None:
+        Path(args.json).write_text(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
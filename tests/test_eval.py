@@ -0,0 +1,50 @@
+import pytest
+
+from kaprese.core.eval import Eval, benchmark_family
+
+
+@pytest.mark.parametrize(
+    "benchmark, family",
+    [("formula-3", "formula"), ("a-b-12", "a-b"), ("formula", "formula"), ("x-", "x-")],
+)
+def test_benchmark_family(benchmark, family):
+    assert benchmark_family(benchmark) == family
+
+
+def _eval(results):
+    eval = Eval("tool")
+    for benchmark, success, elapsed in results:
+        eval.add_result(benchmark, success, elapsed)
+    return eval
+
+
+def test_family_stats():
+    eval = _eval(
+        [(f"a-{i}", i < 3, float(i + 1)) for i in range(10)]
+        + [("b-1", True, None), ("b-2", True, 5.0)]
+    )
+    a, b, all = eval.family_stats()
+
+    assert (a.family, a.total, a.correct, a.accuracy) == ("a", 10, 3, 0.3)
+    assert a.accuracy_low <= a.accuracy <= a.accuracy_high
+    assert 0 <= a.accuracy_low < a.accuracy_high <= 1
+    assert (a.p50, a.p90, a.p99) == pytest.approx((5.5, 9.1, 9.91))
+
+    # Missing runtimes are ignored, a single one is every percentile
+    assert (b.family, b.total, b.correct) == ("b", 2, 2)
+    assert (b.accuracy_low, b.accuracy_high) == (1, 1)
+    assert b.p50 == b.p90 == b.p99 == 5.0
+
+    assert (all.family, all.total, all.correct) == ("all", 12, 5)
+
+
+def test_family_stats_deterministic():
+    eval = _eval([(f"a-{i}", i % 2 == 0, None) for i in range(20)])
+    assert eval.family_stats(seed=1) == eval.family_stats(seed=1)
+    # A single family has no "all" row
+    [stats] = eval.family_stats()
+    assert stats.p50 is stats.p90 is stats.p99 is None
+
+
+def test_family_stats_empty():
+    assert Eval("tool").family_stats() == []
@@ -0,0 +1,32 @@
+from kaprese.core.journal import JOURNAL_FILE, Journal, latest_runs
+
+
+def test_finished_follows_latest_run(tmp_path):
+    with Journal(tmp_path) as journal:
+        journal.record("e", "b-1", "run", True, return_code=0, elapsed=1.0)
+        journal.record("e", "b-2", "run", True, return_code=0, elapsed=1.0)
+        journal.record("e", "b-2", "run", False, return_code=1, elapsed=1.0)
+        journal.record("e", "b-3", "run", False, return_code=1, elapsed=1.0)
+        journal.record("e", "b-3", "run", True, return_code=0, elapsed=1.0)
+        # Only runs count, a later check or prepare does not
+        journal.record("e", "b-1", "prepare", False)
+        journal.record("e", "b-4", "check", True)
+        journal.record("f", "b-2", "run", True, return_code=0, elapsed=1.0)
+
+        assert journal.finished() == {("e", "b-1"), ("e", "b-3"), ("f", "b-2")}
+
+
+def test_torn_line_is_skipped(tmp_path):
+    with Journal(tmp_path) as journal:
+        journal.record("e", "b-1", "run", True, return_code=0, elapsed=1.0)
+    with open(tmp_path / JOURNAL_FILE, "a") as f:
+        f.write('{"engine": "e", "benchmark": "b-2", "pha')
+
+    # Reopening terminates the torn line, the next record is kept
+    with Journal(tmp_path) as journal:
+        journal.record("e", "b-3", "run", True, return_code=0, elapsed=1.0)
+        assert journal.finished() == {("e", "b-1"), ("e", "b-3")}
+
+
+def test_latest_runs_without_journal(tmp_path):
+    assert latest_runs(tmp_path) == {}
@@ -0,0 +1,67 @@
+from kaprese.core.benchmark import Benchmark
+from kaprese.core.engine import Engine
+from kaprese.core.plan import compatibility_index, plan
+
+
+def _benchmark(name, language=None, os=None, *, available=True):
+    benchmark = Benchmark(name, f"image:{name}", _language=language, _os=os)
+    # Known metadata, so planning does not probe any image
+    benchmark._availability = available
+    benchmark._workdir = "/src"
+    return benchmark
+
+
+ENGINES = [
+    Engine("ml", ["ocaml"], ["debian:12"]),
+    Engine("c", ["c", "cpp"], ["debian:12", "ubuntu:22.04"]),
+]
+
+
+def test_compatibility_index():
+    assert compatibility_index(ENGINES) == {
+        ("debian:12", "ocaml"): {"ml"},
+        ("debian:12", "c"): {"c"},
+        ("debian:12", "cpp"): {"c"},
+        ("ubuntu:22.04", "c"): {"c"},
+        ("ubuntu:22.04", "cpp"): {"c"},
+    }
+
+
+def test_plan_splits_pairs():
+    benchmarks = [
+        _benchmark("ml-1", "ocaml", "debian:12"),
+        _benchmark("c-1", "c", "ubuntu:22.04"),
+        _benchmark("rust-1", "rust", "debian:12"),
+        _benchmark("ml-2", "ocaml", "ubuntu:22.04"),
+        _benchmark("pull-1", available=False),
+    ]
+    result = plan(ENGINES, benchmarks, jobs=2)
+
+    def names(pairs):
+        return [(engine.name, benchmark.name) for engine, benchmark in pairs]
+
+    # Benchmarks not pulled yet are planned for every engine
+    assert names(result.pairs) == [
+        ("ml", "ml-1"),
+        ("ml", "pull-1"),
+        ("c", "c-1"),
+        ("c", "pull-1"),
+    ]
+    assert names(result.unsupported) == [
+        ("ml", "c-1"),
+        ("ml", "rust-1"),
+        ("ml", "ml-2"),
+        ("c", "ml-1"),
+        ("c", "rust-1"),
+        ("c", "ml-2"),
+    ]
+    assert [benchmark.name for benchmark in result.unresolved] == ["pull-1"]
+    assert result.counts() == {
+        "ml": {"runnable": 1, "unsupported": 3, "unresolved": 1},
+        "c": {"runnable": 1, "unsupported": 3, "unresolved": 1},
+    }
+
+
+def test_plan_empty():
+    result = plan(ENGINES, [])
+    assert (result.pairs, result.unsupported, result.unresolved) == ([], [], [])
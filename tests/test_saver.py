@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from kaprese.eval import saver
+from kaprese.eval.saver import iter_json_array
+
+ISSUES = [
+    {"bug_type": "MEMORY_LEAK", "qualifier": 'leaked "buf" at [a, b]'},
+    {"bug_type": "NULL_DEREFERENCE", "qualifier": 'escapes \\" \\\\ ] } \n é'},
+    [1, [2, [3]], {"nested": {"]": "["}}],
+    12345678901234567890,
+    -1.5e-3,
+    "",
+    True,
+    None,
+]
+
+
+def _write(tmp_path, text):
+    path = tmp_path / "report.json"
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_array(tmp_path, indent):
+    path = _write(tmp_path, json.dumps(ISSUES, indent=indent))
+    assert list(iter_json_array(path)) == ISSUES
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7])
+def test_iter_json_array_chunk_boundaries(tmp_path, monkeypatch, chunk_size):
+    # Every element and number is split across chunks at some point
+    monkeypatch.setattr(saver, "_CHUNK_SIZE", chunk_size)
+    path = _write(tmp_path, json.dumps(ISSUES, indent=1))
+    assert list(iter_json_array(path)) == ISSUES
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]\n", "\n[\n]"])
+def test_iter_json_array_empty(tmp_path, text):
+    assert list(iter_json_array(_write(tmp_path, text))) == []
+
+
+@pytest.mark.parametrize("text", ["", "{}", '{"a": [1]}', "[1, 2", '[{"a": 1}', "[1x]"])
+def test_iter_json_array_invalid(tmp_path, monkeypatch, text):
+    monkeypatch.setattr(saver, "_CHUNK_SIZE", 2)
+    with pytest.raises(ValueError):
+        list(iter_json_array(_write(tmp_path, text)))
@@ -0,0 +1,66 @@
+import os
+
+from kaprese.eval.scan import INDEX_FILE, scan_outputs
+
+
+def _outputs(tmp_path, *names):
+    for name in names:
+        (tmp_path / "tool" / name).mkdir(parents=True)
+        (tmp_path / "tool" / name / "kaprese.log").write_text("")
+
+
+def _scanner(scanned):
+    def scan(benchmark_dir):
+        scanned.append(benchmark_dir.name)
+        return len(scanned)
+
+    return scan
+
+
+def _touch(path, ns):
+    os.utime(path, ns=(ns, ns))
+
+
+def test_scan_reuses_unchanged_results(tmp_path):
+    _outputs(tmp_path, "b-1", "b-2")
+    scanned = []
+    first = scan_outputs(tmp_path, "tool", _scanner(scanned), jobs=1)
+    assert sorted(scanned) == ["b-1", "b-2"]
+    assert (tmp_path / "tool" / INDEX_FILE).exists()
+
+    scanned.clear()
+    assert scan_outputs(tmp_path, "tool", _scanner(scanned), jobs=1) == first
+    assert scanned == []
+
+
+def test_scan_invalidates_changed_outputs(tmp_path):
+    _outputs(tmp_path, "b-1", "b-2", "b-3")
+    scanned = []
+    scan_outputs(tmp_path, "tool", _scanner(scanned))
+
+    # A new run rewrites kaprese.log, a new file changes the directory
+    _touch(tmp_path / "tool" / "b-1" / "kaprese.log", 10**9)
+    _touch(tmp_path / "tool" / "b-2", 10**9)
+    scanned.clear()
+    scan_outputs(tmp_path, "tool", _scanner(scanned))
+    assert sorted(scanned) == ["b-1", "b-2"]
+
+
+def test_scan_key_invalidates_index(tmp_path):
+    _outputs(tmp_path, "b-1")
+    scanned = []
+    scan_outputs(tmp_path, "tool", _scanner(scanned), key="a")
+    scan_outputs(tmp_path, "tool", _scanner(scanned), key="b")
+    assert scanned == ["b-1", "b-1"]
+
+
+def test_scan_broken_index(tmp_path):
+    _outputs(tmp_path, "b-1")
+    (tmp_path / "tool" / INDEX_FILE).write_text("{")
+    scanned = []
+    assert scan_outputs(tmp_path, "tool", _scanner(scanned)) == {"b-1": 1}
+    assert scanned == ["b-1"]
+
+
+def test_scan_missing_tool(tmp_path):
+    assert scan_outputs(tmp_path, "tool", _scanner([])) == {}
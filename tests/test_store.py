@@ -0,0 +1,82 @@
+import os
+
+from kaprese.core.store import STORE_DIR, OutputStore, detach
+
+
+def _run(output, name, files):
+    run_dir = output / "engine" / name
+    run_dir.mkdir(parents=True)
+    for file, content in files.items():
+        (run_dir / file).write_bytes(content)
+    return run_dir
+
+
+def _blobs(output):
+    return sorted(p for p in (output / STORE_DIR / "objects").rglob("*") if p.is_file())
+
+
+def test_add_deduplicates(tmp_path):
+    shared, small = os.urandom(4096), b"small"
+    first = _run(tmp_path, "b-1", {"out": shared, "log": small})
+    second = _run(tmp_path, "b-2", {"out": shared, "log": small})
+    store = OutputStore(tmp_path)
+
+    stats = store.add(first)
+    stats += store.add(second)
+
+    assert (stats.files, stats.deduplicated, stats.bytes_saved) == (2, 1, 4096)
+    assert os.path.samefile(first / "out", second / "out")
+    # Files below the minimum size are left alone
+    assert not os.path.samefile(first / "log", second / "log")
+    assert (second / "out").read_bytes() == shared
+    assert len(_blobs(tmp_path)) == 1
+
+
+def test_add_twice(tmp_path):
+    run_dir = _run(tmp_path, "b-1", {"out": os.urandom(4096)})
+    store = OutputStore(tmp_path)
+    store.add(run_dir)
+    assert store.add(run_dir).files == 0
+
+
+def test_gc_collects_unlinked_blobs_only(tmp_path):
+    kept, dropped = os.urandom(4096), os.urandom(2048)
+    first = _run(tmp_path, "b-1", {"out": kept})
+    second = _run(tmp_path, "b-2", {"out": dropped})
+    store = OutputStore(tmp_path)
+    store.add(first)
+    store.add(second)
+
+    # Referenced blobs have nlink > 1
+    assert store.gc() == (0, 0)
+    (second / "out").unlink()
+
+    assert store.gc(dry_run=True) == (1, 2048)
+    assert len(_blobs(tmp_path)) == 2
+    assert store.gc() == (1, 2048)
+    [blob] = _blobs(tmp_path)
+    assert blob.read_bytes() == kept
+    assert os.stat(blob).st_nlink == 2
+    # Empty fan-out directories are removed with their last blob
+    assert len(list((tmp_path / STORE_DIR / "objects").iterdir())) == 1
+
+
+def test_gc_without_store(tmp_path):
+    assert OutputStore(tmp_path).gc() == (0, 0)
+
+
+def test_detach(tmp_path):
+    content = os.urandom(4096)
+    first = _run(tmp_path, "b-1", {"out": content})
+    second = _run(tmp_path, "b-2", {"out": content})
+    store = OutputStore(tmp_path)
+    store.add(first)
+    store.add(second)
+
+    assert detach(second) == 1
+    assert os.stat(second / "out").st_nlink == 1
+    (second / "out").write_bytes(b"overwritten")
+    assert (first / "out").read_bytes() == content
+    [blob] = _blobs(tmp_path)
+    assert blob.read_bytes() == content
+    assert detach(second) == 0